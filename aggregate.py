@@ -0,0 +1,379 @@
+import math
+import logging
+import dataclasses
+import lazy
+import profiling
+from schema import COL_CONDICION_OPERACION, COL_IMPUTA_IRP, COL_NO_IMPUTAR, COL_RUC, COL_RUC_EGRESOS
+from schema import COL_TIPO_COMPROBANTE, COL_TOTAL_COMPROBANTE, COL_MONTO_10, COL_MONTO_5, COL_MONTO_0
+from registry import CODE_ACTIV_GRAVADA, CODE_ESTADO_ASOCIACIONES
+from settings import GASTOS_EXTERIOR_SALUD_EDUCACION, GASTOS_VEHICULOS_CADA_3Y
+
+np = lazy.load("numpy")
+
+CONDICION_CREDITO = ["CREDITO", "Crédito"]
+CONDICION_CONTADO = ["CONTADO", "Contado"]
+TIPO_COMPROBANTE_NOTA_CREDITO = "NOTA DE CRÉDITO"
+TIPO_COMPROBANTE_EGRESO_CREDITO = "COMPROBANTE DE EGRESOS POR COMPRAS A CRÉDITO"
+COL_MONTOS = [COL_MONTO_10, COL_MONTO_5, COL_MONTO_0]
+
+IRP_BRACKETS = [
+    (0, 50000000, 0.08),
+    (50000000, 150000000, 0.09),
+    (150000000, None, 0.1),
+]
+
+# one bit per row property, the rows of a frame are grouped by the combination of their bits
+FLAG_CREDITO = 1 << 0
+FLAG_CONTADO = 1 << 1
+FLAG_IMPUTA_NO = 1 << 2
+FLAG_IMPUTA_SI = 1 << 3
+FLAG_NO_IMPUTAR_NO = 1 << 4
+FLAG_NO_IMPUTAR_SI = 1 << 5
+FLAG_ACTIV_GRAVADA = 1 << 6
+FLAG_ESTADO_ASOCIACIONES = 1 << 7
+FLAG_NOTA_CREDITO = 1 << 8
+
+
+@dataclasses.dataclass(frozen=True)
+class IrpRspTotals:
+    raw_compras: int
+    raw_ventas: int
+    raw_egresos: int
+    raw_compras_credito: int
+    raw_compras_contado: int
+    raw_compras_imputa: int
+    raw_compras_no_imputa: int
+    total_compras: int
+    total_ventas: int
+    total_egresos: int
+    total_egresos_activ_gravada: int
+    total_compras_activ_gravada: int
+    total_egresos_estado_asoc: int
+    total_compras_estado_asoc: int
+    total_gastos_salud_educ: int
+    total_gastos_vehiculo_cada_3y: int
+    total_gastos_activ_gravada: int
+    total_gastos_estado_asoc: int
+    total_gastos_familiares: int
+    total_gastos_by_type: int
+    total_gastos: int
+    total_diff: int
+    irp_8p: int
+    irp_9p: int
+    irp_10p: int
+    total_irp: int
+
+
+@dataclasses.dataclass(frozen=True)
+class IvaTotals:
+    total_compras_10: int
+    total_compras_5: int
+    total_compras_0: int
+    total_ventas_10: int
+    total_ventas_5: int
+    total_ventas_0: int
+    total_egresos: int
+    total_gastos_10: int
+    total_gastos_5: int
+    total_gastos_0: int
+
+
+def row_flags(data, conditions):
+    flags = np.zeros(len(data), dtype=np.int64)
+    for flag, mask in conditions:
+        flags |= np.where(np.asarray(mask, dtype=bool), flag, 0)
+    return flags
+
+
+def grouped_sums(data, flags):
+    # the single reduction of a frame: amounts summed by flag combination
+    sums = data[COL_TOTAL_COMPROBANTE].groupby(flags, sort=False).sum()
+    return dict(zip(sums.index.tolist(), sums.tolist()))
+
+
+def sum_where(sums, required=0, excluded=0):
+    return sum(total for flags, total in sums.items() if flags & required == required and not flags & excluded)
+
+
+def irp_brackets(total_diff):
+    # total_diff is either a single amount or an array with one amount per scenario
+    taxes = []
+    for lower, upper, rate in IRP_BRACKETS:
+        base = np.maximum(np.asarray(total_diff, dtype=np.int64) - lower, 0)
+        if upper is not None:
+            base = np.minimum(base, upper - lower)
+        taxes.append(np.ceil(base * rate).astype(np.int64))
+    return taxes
+
+
+def irp_bracket_taxes(total_diff):
+    # irp_brackets of a single amount in plain python, so finishing stored sums does not need numpy
+    taxes = []
+    for lower, upper, rate in IRP_BRACKETS:
+        base = max(total_diff - lower, 0)
+        if upper is not None:
+            base = min(base, upper - lower)
+        taxes.append(math.ceil(base * rate))
+    return taxes
+
+
+def merge_sums(sums_list):
+    # partial sums of disjoint slices of the rows add up to the sums of all of them, key by key
+    merged = {}
+    for sums in sums_list:
+        for key, value in sums.items():
+            if isinstance(value, dict):
+                merged[key] = merge_sums([merged.get(key, {}), value])
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+@profiling.profiled("irp_rsp_partials")
+def irp_rsp_partials(compras, ventas, egresos, ruc_registry):
+    # a single registry lookup per frame gives the category code of every row
+    compras_ruc_codes = ruc_registry.classify(compras[COL_RUC])
+    egresos_ruc_codes = ruc_registry.classify(egresos[COL_RUC_EGRESOS])
+
+    compras_conditions = [
+        (FLAG_CREDITO, compras[COL_CONDICION_OPERACION].isin(CONDICION_CREDITO)),
+        (FLAG_CONTADO, compras[COL_CONDICION_OPERACION].isin(CONDICION_CONTADO)),
+        (FLAG_IMPUTA_NO, compras[COL_IMPUTA_IRP] == "NO"),
+        (FLAG_IMPUTA_SI, compras[COL_IMPUTA_IRP] == "SI"),
+        (FLAG_ACTIV_GRAVADA, compras_ruc_codes == CODE_ACTIV_GRAVADA),
+        (FLAG_ESTADO_ASOCIACIONES, compras_ruc_codes == CODE_ESTADO_ASOCIACIONES),
+    ]
+    if COL_NO_IMPUTAR in compras:
+        compras_conditions += [
+            (FLAG_NO_IMPUTAR_NO, compras[COL_NO_IMPUTAR] == "NO"),
+            (FLAG_NO_IMPUTAR_SI, compras[COL_NO_IMPUTAR] == "SI"),
+        ]
+    compras_sums = grouped_sums(compras, row_flags(compras, compras_conditions))
+
+    ventas_sums = grouped_sums(ventas, row_flags(ventas, [
+        (FLAG_CREDITO, ventas[COL_CONDICION_OPERACION].isin(CONDICION_CREDITO)),
+        (FLAG_IMPUTA_NO, ventas[COL_IMPUTA_IRP] == "NO"),
+        (FLAG_NOTA_CREDITO, ventas[COL_TIPO_COMPROBANTE] == TIPO_COMPROBANTE_NOTA_CREDITO),
+    ]))
+
+    egresos_sums = grouped_sums(egresos, row_flags(egresos, [
+        (FLAG_IMPUTA_NO, egresos[COL_IMPUTA_IRP] == "NO"),
+        (FLAG_ACTIV_GRAVADA, egresos_ruc_codes == CODE_ACTIV_GRAVADA),
+        (FLAG_ESTADO_ASOCIACIONES, egresos_ruc_codes == CODE_ESTADO_ASOCIACIONES),
+    ]))
+
+    return {"compras": compras_sums, "ventas": ventas_sums, "egresos": egresos_sums}
+
+
+def finish_irp_rsp(partials, gastos_salud_educ=0, gastos_vehiculos_cada_3y=0):
+    compras_sums, ventas_sums, egresos_sums = partials["compras"], partials["ventas"], partials["egresos"]
+
+    # ensure that the deducted compras are either for IRP deduction or not
+    for flags in compras_sums:
+        if not flags & FLAG_CREDITO:
+            assert flags & (FLAG_IMPUTA_NO | FLAG_NO_IMPUTAR_NO) != FLAG_IMPUTA_NO | FLAG_NO_IMPUTAR_NO
+            assert flags & (FLAG_IMPUTA_SI | FLAG_NO_IMPUTAR_SI) != FLAG_IMPUTA_SI | FLAG_NO_IMPUTAR_SI
+
+    # CREDITO rows cannot be deducted without an EGRESOS entry, and rows flagged with "NO" are not deducted for IRP
+    compras_excluded = FLAG_CREDITO | FLAG_IMPUTA_NO
+    ventas_excluded = FLAG_CREDITO | FLAG_IMPUTA_NO | FLAG_NOTA_CREDITO
+
+    total_compras = sum_where(compras_sums, excluded=compras_excluded)
+    total_ventas = sum_where(ventas_sums, excluded=ventas_excluded)
+    total_egresos = sum_where(egresos_sums, excluded=FLAG_IMPUTA_NO)
+
+    total_egresos_activ_gravada = sum_where(egresos_sums, FLAG_ACTIV_GRAVADA, FLAG_IMPUTA_NO) - gastos_vehiculos_cada_3y
+    total_compras_activ_gravada = sum_where(compras_sums, FLAG_ACTIV_GRAVADA, compras_excluded)
+    total_egresos_estado_asoc = sum_where(egresos_sums, FLAG_ESTADO_ASOCIACIONES, FLAG_IMPUTA_NO)
+    total_compras_estado_asoc = sum_where(compras_sums, FLAG_ESTADO_ASOCIACIONES, compras_excluded)
+
+    total_gastos_estado_asoc = total_compras_estado_asoc + total_egresos_estado_asoc
+    total_gastos_activ_gravada = total_egresos_activ_gravada + total_compras_activ_gravada
+
+    total_gastos = total_compras + total_egresos
+    total_gastos_familiares = total_gastos - total_gastos_activ_gravada - gastos_salud_educ - total_gastos_estado_asoc - gastos_vehiculos_cada_3y
+    total_gastos_by_type = gastos_salud_educ + total_gastos_estado_asoc + total_gastos_activ_gravada + total_gastos_familiares + gastos_vehiculos_cada_3y
+
+    total_diff = total_ventas - total_compras - total_egresos
+    irp_8p, irp_9p, irp_10p = irp_bracket_taxes(total_diff)
+
+    return IrpRspTotals(
+        raw_compras=sum_where(compras_sums),
+        raw_ventas=sum_where(ventas_sums),
+        raw_egresos=sum_where(egresos_sums),
+        raw_compras_credito=sum_where(compras_sums, excluded=FLAG_CONTADO),
+        raw_compras_contado=sum_where(compras_sums, excluded=FLAG_CREDITO),
+        raw_compras_imputa=sum_where(compras_sums, excluded=FLAG_IMPUTA_NO),
+        raw_compras_no_imputa=sum_where(compras_sums, excluded=FLAG_IMPUTA_SI),
+        total_compras=total_compras,
+        total_ventas=total_ventas,
+        total_egresos=total_egresos,
+        total_egresos_activ_gravada=total_egresos_activ_gravada,
+        total_compras_activ_gravada=total_compras_activ_gravada,
+        total_egresos_estado_asoc=total_egresos_estado_asoc,
+        total_compras_estado_asoc=total_compras_estado_asoc,
+        total_gastos_salud_educ=gastos_salud_educ,
+        total_gastos_vehiculo_cada_3y=gastos_vehiculos_cada_3y,
+        total_gastos_activ_gravada=total_gastos_activ_gravada,
+        total_gastos_estado_asoc=total_gastos_estado_asoc,
+        total_gastos_familiares=total_gastos_familiares,
+        total_gastos_by_type=total_gastos_by_type,
+        total_gastos=total_gastos,
+        total_diff=total_diff,
+        irp_8p=irp_8p,
+        irp_9p=irp_9p,
+        irp_10p=irp_10p,
+        total_irp=irp_8p + irp_9p + irp_10p,
+    )
+
+
+@profiling.profiled("aggregate_irp_rsp")
+def aggregate_irp_rsp(compras, ventas, egresos, ruc_registry, gastos_salud_educ=0, gastos_vehiculos_cada_3y=0):
+    return finish_irp_rsp(irp_rsp_partials(compras, ventas, egresos, ruc_registry),
+                          gastos_salud_educ=gastos_salud_educ, gastos_vehiculos_cada_3y=gastos_vehiculos_cada_3y)
+
+
+def masked_sums(data, columns, keep=None):
+    values = data[columns].to_numpy(dtype=np.int64)
+    if keep is not None:
+        values = values[keep.to_numpy(dtype=bool)]
+    return [int(total) for total in values.sum(axis=0)]
+
+
+@profiling.profiled("iva_partials")
+def iva_partials(compras, ventas, egresos):
+    # rows flagged with "NO" are not deducted, and egresos of credit purchases are not payments yet
+    total_compras_10, total_compras_5, total_compras_0 = masked_sums(compras, COL_MONTOS, compras[COL_IMPUTA_IRP] != "NO")
+    total_ventas_10, total_ventas_5, total_ventas_0 = masked_sums(ventas, COL_MONTOS)
+    total_egresos, = masked_sums(egresos, [COL_TOTAL_COMPROBANTE],
+                                 egresos[COL_TIPO_COMPROBANTE] != TIPO_COMPROBANTE_EGRESO_CREDITO)
+
+    return {
+        "total_compras_10": total_compras_10,
+        "total_compras_5": total_compras_5,
+        "total_compras_0": total_compras_0,
+        "total_ventas_10": total_ventas_10,
+        "total_ventas_5": total_ventas_5,
+        "total_ventas_0": total_ventas_0,
+        "total_egresos": total_egresos,
+    }
+
+
+def finish_iva(partials):
+    return IvaTotals(
+        **partials,
+        total_gastos_10=partials["total_compras_10"],
+        total_gastos_5=partials["total_compras_5"],
+        total_gastos_0=partials["total_compras_0"] + partials["total_egresos"],
+    )
+
+
+@profiling.profiled("aggregate_iva")
+def aggregate_iva(compras, ventas, egresos):
+    return finish_iva(iva_partials(compras, ventas, egresos))
+
+
+def form_partials(compras, ventas, egresos, ruc_registry):
+    # everything both forms need from the rows, sums of row slices can be merged with merge_sums
+    return {
+        "iva": iva_partials(compras, ventas, egresos),
+        "irp_rsp": irp_rsp_partials(compras, ventas, egresos, ruc_registry),
+    }
+
+
+def finish_forms(partials):
+    iva_totals = finish_iva(partials["iva"])
+    irp_rsp_totals = finish_irp_rsp(partials["irp_rsp"],
+                                    gastos_salud_educ=GASTOS_EXTERIOR_SALUD_EDUCACION,
+                                    gastos_vehiculos_cada_3y=GASTOS_VEHICULOS_CADA_3Y)
+    return iva_totals, irp_rsp_totals
+
+
+def aggregate_forms(compras, ventas, egresos, ruc_registry):
+    iva_totals = aggregate_iva(compras, ventas, egresos)
+    irp_rsp_totals = aggregate_irp_rsp(compras, ventas, egresos, ruc_registry,
+                                       gastos_salud_educ=GASTOS_EXTERIOR_SALUD_EDUCACION,
+                                       gastos_vehiculos_cada_3y=GASTOS_VEHICULOS_CADA_3Y)
+    return iva_totals, irp_rsp_totals
+
+
+def log_iva_totals(totals):
+    logging.info("")
+
+    logging.info(f"Total compras 10%: {totals.total_compras_10} Gs")
+    logging.info(f"Total compras 5%: {totals.total_compras_5} Gs")
+    logging.info(f"Total compras 0%: {totals.total_compras_0} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total egresos 0%: {totals.total_egresos} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total ventas 10%: {totals.total_ventas_10} Gs")
+    logging.info(f"Total ventas 5%: {totals.total_ventas_5} Gs")
+    logging.info(f"Total ventas 0%: {totals.total_ventas_0} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total gastos 10%: {totals.total_gastos_10} Gs")
+    logging.info(f"Total gastos 5%: {totals.total_gastos_5} Gs")
+    logging.info(f"Total gastos 0%: {totals.total_gastos_0} Gs")
+
+    logging.info("")
+
+
+def log_irp_rsp_totals(totals):
+    logging.info("")
+
+    logging.info(f"RAW compras: {totals.raw_compras:,} Gs")
+    logging.info(f"RAW ventas: {totals.raw_ventas:,} Gs")
+    logging.info(f"RAW egresos: {totals.raw_egresos:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"RAW compras credito: {totals.raw_compras_credito:,} Gs")
+    logging.info(f"RAW compras contado: {totals.raw_compras_contado:,} Gs")
+    logging.info(f"RAW compras imputa: {totals.raw_compras_imputa:,} Gs")
+    logging.info(f"RAW compras no imputa: {totals.raw_compras_no_imputa:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total ventas prestacion servicios profesionales: {totals.total_ventas:,} Gs")
+    logging.info("")
+
+    logging.info(f"Total egresos actividad gravada: {totals.total_egresos_activ_gravada:,} Gs")
+    logging.info(f"Total compras actividad gravada: {totals.total_compras_activ_gravada:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total egresos estado / asociaciones: {totals.total_egresos_estado_asoc:,} Gs")
+    logging.info(f"Total compras estado / asociaciones: {totals.total_compras_estado_asoc:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total gastos en actividad gravada: {totals.total_gastos_activ_gravada:,} Gs")
+    logging.info(f"Total gastos familiares: {totals.total_gastos_familiares:,} Gs")
+    logging.info(f"Total gastos en el exterior salud / educacion: {totals.total_gastos_salud_educ:,} Gs")
+    logging.info(f"Total gastos en vehiculo cada 3y: {totals.total_gastos_vehiculo_cada_3y:,} Gs")
+    logging.info(f"Total gastos en estado y asociaciones: {totals.total_gastos_estado_asoc:,} Gs")
+    logging.info(f"Total gastos by type: {totals.total_gastos_by_type:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total compras: {totals.total_compras:,} Gs")
+    logging.info(f"Total egresos: {totals.total_egresos:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total gastos: {totals.total_gastos:,} Gs")
+    logging.info(f"Total ventas: {totals.total_ventas:,} Gs")
+
+    logging.info("")
+
+    logging.info(f"Total difference: {totals.total_diff:,} Gs")
+
+    logging.info(f"IRP 8% (0-50M): {totals.irp_8p:,} Gs")
+    logging.info(f"IRP 9% (50-150M): {totals.irp_9p:,} Gs")
+    logging.info(f"IRP 10% (> 150M): {totals.irp_10p:,} Gs")
+    logging.info(f"Total IRP-RSP to pay: {totals.total_irp:,} Gs")
@@ -0,0 +1,106 @@
+import os
+import csv
+import sys
+import json
+import argparse
+import logging
+import pathlib
+import dataclasses
+import lazy
+import loader
+import registry
+import aggregate
+import csv_stream
+from functools import partial
+from concurrent import futures
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.INFO)
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def list_taxpayers(root=None, manifest=None):
+    if manifest is not None:
+        # one taxpayer directory per line, relative paths are resolved against the manifest location
+        manifest = pathlib.Path(manifest)
+        paths = []
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(manifest.parent / line)
+        return paths
+
+    return sorted(path for path in pathlib.Path(root).iterdir() if path.is_dir() and not path.name.startswith("."))
+
+
+def compute_taxpayer(path, cache_dir=None):
+    row = {"taxpayer": pathlib.Path(path).name, "path": str(path), "status": STATUS_OK, "error": ""}
+
+    try:
+        # taxpayers are already spread over processes, so each one parses its own workbooks serially
+        ruc_registry = registry.load_registry(data_path=path, cache_dir=cache_dir)
+        csv_file_paths = csv_stream.list_exports(path)
+        if csv_file_paths:
+            partials = csv_stream.load_partials(path, ruc_registry, workers=1, cache_dir=cache_dir,
+                                                csv_file_paths=csv_file_paths)
+            iva_totals, irp_rsp_totals = aggregate.finish_forms(partials)
+        else:
+            compras, ventas, egresos, ingresos = loader.load_data(path, workers=1, cache_dir=cache_dir)
+            iva_totals, irp_rsp_totals = aggregate.aggregate_forms(compras, ventas, egresos, ruc_registry)
+    except Exception as e:
+        row.update(status=STATUS_FAILED, error=f"{type(e).__name__}: {e}")
+        return row
+
+    row.update({f"iva_{name}": value for name, value in dataclasses.asdict(iva_totals).items()})
+    row.update({f"irp_rsp_{name}": value for name, value in dataclasses.asdict(irp_rsp_totals).items()})
+
+    return row
+
+
+def write_results(rows, output_path):
+    output_path = pathlib.Path(output_path)
+
+    if output_path.suffix == ".json":
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        return
+
+    # failed taxpayers have no totals, so the header is the union of every row's columns
+    fieldnames = []
+    for row in rows:
+        fieldnames.extend(name for name in row if name not in fieldnames)
+
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    taxpayers_group = parser.add_mutually_exclusive_group(required=True)
+    taxpayers_group.add_argument('--root', type=str, help="directory with one sub directory per taxpayer")
+    taxpayers_group.add_argument('--manifest', type=str, help="file listing one taxpayer directory per line")
+    parser.add_argument('--output', type=str, default="results.csv", help="results table, .csv or .json")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processes the taxpayers are spread over")
+    parser.add_argument('--cache-dir', type=str, default=None, help="directory where parsed workbooks are cached")
+    args = parser.parse_args()
+
+    paths = list_taxpayers(root=args.root, manifest=args.manifest)
+    logging.info(f"Computing forms for {len(paths)} taxpayers")
+
+    rows = []
+    lazy.preload()
+    with futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for row in executor.map(partial(compute_taxpayer, cache_dir=args.cache_dir), paths, chunksize=8):
+            if row["status"] == STATUS_FAILED:
+                logging.error(f"Failed {row['path']}: {row['error']}")
+            rows.append(row)
+
+    write_results(rows, args.output)
+
+    total_failed = sum(row["status"] == STATUS_FAILED for row in rows)
+    logging.info(f"Wrote {len(rows)} taxpayers to {args.output}, {total_failed} failed")
+
+    sys.exit(1 if total_failed else 0)
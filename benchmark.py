@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import argparse
+import logging
+import pathlib
+import platform
+import datetime
+import tracemalloc
+import numpy as np
+import pandas as pd
+import dedup
+import loader
+import schema
+import registry
+import aggregate
+import synthetic
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.INFO)
+
+BENCHMARK_SIZES = [1000, 10000, 100000]
+
+
+def total_rows(result):
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        result = tuple(result.values())
+    if isinstance(result, tuple) and all(isinstance(item, pd.DataFrame) for item in result):
+        return sum(len(item) for item in result)
+    return 1
+
+
+def measure(stage, size, rows_in, func, repeat):
+    # timings are taken without tracemalloc, which slows allocations down, the peak memory in one extra run
+    wall_times, cpu_times = [], []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = func()
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    tracemalloc.start()
+    func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {
+        "stage": stage,
+        "size": size,
+        "rows_in": rows_in,
+        "rows_out": total_rows(result),
+        "wall_seconds": min(wall_times),
+        "cpu_seconds": min(cpu_times),
+        "peak_bytes": peak_bytes,
+    }
+    logging.info(f"{stage} ({size:,} rows): {record['wall_seconds']:.4f}s, {peak_bytes:,} bytes peak")
+
+    return record, result
+
+
+def benchmark_size(data_path, size, repeat, workers):
+    records = []
+
+    record, (compras, ventas, egresos, ingresos) = measure(
+        "load_data", size, size, lambda: loader.load_data(data_path, workers=workers), repeat)
+    records.append(record)
+
+    # then the stages load_data and the forms run, one at a time on the output of the previous one
+    xls_file_paths = loader.list_workbooks(data_path)
+    record, data = measure("read_workbook", size, size,
+                           lambda: pd.concat([loader.read_workbook(path) for path in xls_file_paths]), repeat)
+    records.append(record)
+
+    record, data = measure("conform", size, len(data), lambda: schema.conform(data), repeat)
+    records.append(record)
+    record, data = measure("deduplicate", size, len(data), lambda: dedup.deduplicate(data), repeat)
+    records.append(record)
+    record, partitions = measure("partition_tipo_registro", size, len(data),
+                                 lambda: loader.partition_tipo_registro(data), repeat)
+    records.append(record)
+
+    compras, ventas, egresos = partitions["COMPRAS"], partitions["VENTAS"], partitions["EGRESOS"]
+    ruc_registry = registry.load_registry(data_path=data_path)
+
+    rows_in = len(compras) + len(ventas) + len(egresos)
+    record, _ = measure("iva_partials", size, rows_in, lambda: aggregate.iva_partials(compras, ventas, egresos), repeat)
+    records.append(record)
+    record, _ = measure("irp_rsp_partials", size, rows_in,
+                        lambda: aggregate.irp_rsp_partials(compras, ventas, egresos, ruc_registry), repeat)
+    records.append(record)
+
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs="+", default=BENCHMARK_SIZES, help="rows of each generated dataset")
+    parser.add_argument('--data-dir', type=str, default="benchmark_data", help="where the generated workbooks are kept")
+    parser.add_argument('--output', type=str, default="benchmark.json")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1, help="processes used by load_data, 1 keeps peak memory exact")
+    args = parser.parse_args()
+
+    records = []
+    for size in args.sizes:
+        # generated workbooks are reused between runs so that only the calculator is measured
+        data_path = pathlib.Path(args.data_dir) / f"rows_{size}"
+        if not any(data_path.glob("*.xlsx")):
+            synthetic.generate(data_path, size)
+
+        records.extend(benchmark_size(data_path, size, args.repeat, args.workers))
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "results": records,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    logging.info(f"Wrote {len(records)} results to {args.output}")
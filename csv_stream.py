@@ -0,0 +1,177 @@
+import os
+import re
+import csv
+import logging
+import pathlib
+import unicodedata
+import lazy
+import dedup
+import schema
+import loader
+import profiling
+import registry
+import aggregate
+from functools import partial
+from concurrent import futures
+
+pd = lazy.load("pandas")
+
+CSV_SUFFIXES = [".csv", ".txt"]
+CSV_DELIMITERS = [";", "|", "\t", ","]
+CSV_CHUNK_ROWS = 100000
+CSV_ENCODING = "utf-8-sig"
+CSV_FALLBACK_ENCODING = "latin-1"
+
+# a csv / txt whose header does not map these is not an export, e.g. notes kept next to the workbooks
+CSV_REQUIRED_COLUMNS = [schema.COL_TIPO_REGISTRO, schema.COL_TOTAL_COMPROBANTE]
+
+
+def header_key(name):
+    # the text exports spell the headers with other case, accents and symbols than the "Datos" sheet, e.g.
+    # "RUC / N° de Identificación del Informado" and "RUC / Nº de Identificacion del Informado" are the same column
+    text = unicodedata.normalize("NFD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def sniff_format(csv_file_path, encoding=CSV_ENCODING):
+    with open(csv_file_path, "rb") as f:
+        first_line = f.readline()
+
+    try:
+        header = first_line.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = CSV_FALLBACK_ENCODING
+        header = first_line.decode(encoding)
+
+    delimiter = max(CSV_DELIMITERS, key=header.count)
+    headers = next(csv.reader([header.rstrip("\r\n")], delimiter=delimiter))
+    return delimiter, encoding, headers
+
+
+def map_columns(headers):
+    # every COL_* name the forms read is taken from the header with the exact same name, otherwise from the first
+    # header that only differs in spelling, so a single RUC column of an export feeds every RUC header variant
+    columns = {}
+    for name in loader.COL_DATOS_DTYPES:
+        if name in headers:
+            columns[name] = name
+            continue
+
+        matches = [header for header in headers if header_key(header) == header_key(name)]
+        if matches:
+            columns[name] = matches[0]
+
+    return columns
+
+
+def skip_reason(csv_file_path):
+    # why a csv / txt of the taxpayer directory is not read as an export, None when it is one
+    headers = sniff_format(csv_file_path)[2]
+
+    # the --duplicates-output report carries the exported columns too, its rows must not be counted a second time
+    if dedup.COL_KIND in headers:
+        return "it is a report of duplicated comprobantes"
+
+    columns = map_columns(headers)
+    missing = [name for name in CSV_REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        return f"its header has no {', '.join(missing)} column"
+
+    return None
+
+
+def list_csv_files(path):
+    # the registry file of the taxpayer directory is a csv as well, but not an export
+    return sorted(
+        csv_file_path for csv_file_path in pathlib.Path(path).iterdir()
+        if csv_file_path.suffix.lower() in CSV_SUFFIXES and csv_file_path.is_file()
+        and csv_file_path.name != registry.REGISTRY_FILE_NAME
+    )
+
+
+def list_exports(path):
+    csv_file_paths = []
+    for csv_file_path in list_csv_files(path):
+        reason = skip_reason(csv_file_path)
+        if reason is not None:
+            logging.warning(f"Skipping {csv_file_path}, {reason}")
+            continue
+
+        csv_file_paths.append(csv_file_path)
+
+    return csv_file_paths
+
+
+def read_chunks(csv_file_path, chunk_rows=CSV_CHUNK_ROWS, encoding=CSV_ENCODING, thousands=None):
+    delimiter, encoding, headers = sniff_format(csv_file_path, encoding=encoding)
+    columns = map_columns(headers)
+    if schema.COL_TIPO_REGISTRO not in columns:
+        raise ValueError(f"{csv_file_path} has no {schema.COL_TIPO_REGISTRO} column")
+
+    # the C parser converts the amounts itself, every other column is kept as text like the workbook cells
+    dtypes = {header: loader.COL_DATOS_DTYPES[name] for name, header in columns.items()}
+    dtypes = {header: str if dtype is object else dtype for header, dtype in dtypes.items()}
+
+    reader = pd.read_csv(csv_file_path, sep=delimiter, encoding=encoding, engine="c", usecols=list(dtypes),
+                         dtype=dtypes, thousands=thousands, chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            yield pd.DataFrame({name: chunk[header] for name, header in columns.items()})
+
+
+@profiling.profiled("reduce_export")
+def reduce_export(csv_file_path, ruc_registry, chunk_rows=CSV_CHUNK_ROWS, encoding=CSV_ENCODING, thousands=None):
+    # each chunk is reduced to the partial sums of both forms before the next one is parsed,
+    # so memory stays bounded by chunk_rows no matter how large the export is
+    partials = {}
+    for chunk in read_chunks(csv_file_path, chunk_rows=chunk_rows, encoding=encoding, thousands=thousands):
+        partitions = loader.partition_tipo_registro(schema.conform(chunk))
+        chunk_partials = aggregate.form_partials(partitions["COMPRAS"], partitions["VENTAS"], partitions["EGRESOS"],
+                                                 ruc_registry)
+        partials = aggregate.merge_sums([partials, chunk_partials])
+
+    return partials
+
+
+def load_partials(path, ruc_registry, workers=None, cache_dir=None, chunk_rows=CSV_CHUNK_ROWS, encoding=CSV_ENCODING,
+                  thousands=None, csv_file_paths=None):
+    # callers that already listed the exports pass them, so skipped files are only warned about once
+    if csv_file_paths is None:
+        csv_file_paths = list_exports(path)
+    for csv_file_path in csv_file_paths:
+        logging.info(f"Loading {csv_file_path}")
+
+    export_workers = min(workers or os.cpu_count() or 1, max(len(csv_file_paths), 1))
+
+    reduce = partial(reduce_export, ruc_registry=ruc_registry, chunk_rows=chunk_rows, encoding=encoding,
+                     thousands=thousands)
+    if export_workers > 1:
+        lazy.preload()
+        with futures.ProcessPoolExecutor(max_workers=export_workers) as executor:
+            if profiling.enabled:
+                partials = profiling.gather(executor.map(partial(profiling.collect, reduce), csv_file_paths))
+            else:
+                partials = list(executor.map(reduce, csv_file_paths))
+    else:
+        partials = [reduce(csv_file_path) for csv_file_path in csv_file_paths]
+
+    # workbooks next to the exports are loaded as usual and reduced the same way
+    if loader.list_workbooks(path):
+        compras, ventas, egresos, ingresos = loader.load_data(path, workers=workers, cache_dir=cache_dir)
+        partials.append(aggregate.form_partials(compras, ventas, egresos, ruc_registry))
+
+    logging.info(f"Loaded {len(csv_file_paths)} total exports")
+
+    return aggregate.merge_sums(partials)
+
+
+def add_arguments(parser):
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS, help="rows of a csv/txt export parsed at once")
+    parser.add_argument('--csv-encoding', type=str, default=CSV_ENCODING)
+    parser.add_argument('--csv-thousands', type=str, default=None, help="thousands separator of the export amounts")
+
+
+def load_args(args, ruc_registry, csv_file_paths=None):
+    return load_partials(args.path, ruc_registry, workers=args.workers, cache_dir=args.cache_dir,
+                         chunk_rows=args.chunk_rows, encoding=args.csv_encoding, thousands=args.csv_thousands,
+                         csv_file_paths=csv_file_paths)
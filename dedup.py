@@ -0,0 +1,109 @@
+import logging
+import lazy
+import profiling
+from schema import COL_TIMBRADO, COL_NUMERO_COMPROBANTE, COL_TIPO_REGISTRO, COL_TOTAL_COMPROBANTE, COL_ARCHIVO
+from schema import COL_RUC, COL_RUC_EGRESOS
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+DUPLICATES_KEEP = "keep"
+DUPLICATES_REPORT = "report"
+DUPLICATES_DROP = "drop"
+DUPLICATES_MODES = [DUPLICATES_KEEP, DUPLICATES_REPORT, DUPLICATES_DROP]
+
+KIND_ORIGINAL = "original"
+KIND_EXACT = "exact"
+KIND_CONFLICTING = "conflicting"
+
+COL_KIND = "Duplicado"
+COL_RUC_KEY = "RUC"
+
+
+def key_rucs(data):
+    # compras and ventas carry the RUC of the counterparty under COL_RUC (schema.conform already folded the header
+    # variants into it), egresos under COL_RUC_EGRESOS
+    rucs = data[COL_RUC].astype(object)
+    return rucs.where(rucs.notna(), data[COL_RUC_EGRESOS].astype(object))
+
+
+def comprobante_keys(data):
+    keys = pd.DataFrame({
+        COL_TIMBRADO: data[COL_TIMBRADO] if COL_TIMBRADO in data else None,
+        COL_NUMERO_COMPROBANTE: data[COL_NUMERO_COMPROBANTE],
+        COL_RUC_KEY: key_rucs(data),
+        COL_TIPO_REGISTRO: data[COL_TIPO_REGISTRO],
+    }, index=data.index)
+
+    # one 64 bit hash per row, factorize then turns the hashes into dense key codes through a hash table,
+    # both are linear in the rows
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    codes, _ = pd.factorize(hashes)
+
+    # rows without a comprobante number cannot be told apart, they are never duplicates
+    codes[data[COL_NUMERO_COMPROBANTE].isna().to_numpy()] = -1
+
+    return keys, codes
+
+
+def find_duplicates(data):
+    # returns the report of every row whose key shows up more than once and the positions of the exact duplicates,
+    # the first row of a key (in workbook order) is the original the others are compared with
+    keys, codes = comprobante_keys(data)
+    identified = codes >= 0
+
+    counts = np.bincount(codes[identified], minlength=1)
+    repeated = np.flatnonzero(identified & (counts[np.maximum(codes, 0)] > 1))
+    if not repeated.size:
+        return pd.DataFrame(columns=[COL_KIND, *keys.columns, COL_TOTAL_COMPROBANTE, COL_ARCHIVO]), repeated
+
+    repeated_codes = codes[repeated]
+    later = pd.Series(repeated_codes).duplicated(keep="first").to_numpy()
+
+    # position of the original of every key, only filled for the repeated ones
+    originals = np.empty(len(counts), dtype=np.int64)
+    originals[repeated_codes[~later]] = repeated[~later]
+
+    totals = data[COL_TOTAL_COMPROBANTE].to_numpy()
+    same_total = totals[repeated] == totals[originals[repeated_codes]]
+
+    kinds = np.where(~later, KIND_ORIGINAL, np.where(same_total, KIND_EXACT, KIND_CONFLICTING))
+
+    report = keys.take(repeated)
+    report.insert(0, COL_KIND, kinds)
+    report[COL_TOTAL_COMPROBANTE] = totals[repeated]
+    report[COL_ARCHIVO] = data[COL_ARCHIVO].take(repeated).to_numpy() if COL_ARCHIVO in data else None
+
+    # the rows of a key are listed together, originals first
+    order = np.argsort(repeated_codes, kind="stable")
+    report = report.take(order).reset_index(drop=True)
+
+    return report, repeated[later & same_total]
+
+
+@profiling.profiled("deduplicate")
+def deduplicate(data, duplicates=DUPLICATES_REPORT, report_path=None):
+    if duplicates == DUPLICATES_KEEP:
+        return data
+
+    report, exact_rows = find_duplicates(data)
+
+    total_exact = int((report[COL_KIND] == KIND_EXACT).sum())
+    total_conflicting = int((report[COL_KIND] == KIND_CONFLICTING).sum())
+    if total_exact or total_conflicting:
+        logging.warning(f"Found {total_exact} exact and {total_conflicting} conflicting duplicate comprobantes")
+        for archivo, rows in report[report[COL_KIND] != KIND_ORIGINAL].groupby(COL_ARCHIVO, sort=True).size().items():
+            logging.warning(f"  {rows} duplicates in {archivo}")
+
+    if report_path is not None:
+        report.to_csv(report_path, index=False)
+        logging.info(f"Wrote {len(report)} duplicated rows to {report_path}")
+
+    if duplicates == DUPLICATES_DROP and exact_rows.size:
+        # conflicting rows are only reported, which total is the right one is not something to guess
+        keep = np.ones(len(data), dtype=bool)
+        keep[exact_rows] = False
+        data = data.take(np.flatnonzero(keep))
+        logging.info(f"Dropped {exact_rows.size} exact duplicates")
+
+    return data
@@ -0,0 +1,32 @@
+import sys
+import types
+import importlib
+
+# names handed out by load, in the order they were asked for
+deferred = []
+
+
+class LazyModule(types.ModuleType):
+    # stands in for a module until one of its attributes is used. The real module is imported through the regular
+    # import machinery, whose per-module locks make threads that get there first wait for a complete module,
+    # unlike importlib.util.LazyLoader which on python 3.11 lets them see it half executed
+    def __getattr__(self, name):
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def load(name):
+    # the module is executed the first time one of its attributes is used, so runs that never touch pandas, numpy
+    # or openpyxl (e.g. summing stored rollups) do not pay for importing them
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if name not in deferred:
+        deferred.append(name)
+    return LazyModule(name)
+
+
+def preload():
+    # process pools fork their workers from this process, importing the deferred modules right before creating one
+    # lets every worker inherit them instead of importing them again on its own
+    for name in deferred:
+        importlib.import_module(name)
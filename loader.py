@@ -0,0 +1,158 @@
+import os
+import logging
+import pathlib
+import lazy
+import dedup
+import schema
+import profiling
+import xlsx_stream
+import workbook_cache
+from functools import partial
+from concurrent import futures
+from schema import COL_TIPO_REGISTRO
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+COL_TIPO_TODOS = ["VENTAS", "COMPRAS", "INGRESOS", "EGRESOS"]
+
+# only these columns of the "Datos" sheet are read, everything else in the export is skipped while streaming;
+# it covers what both the IVA and the IRP-RSP forms need, including every RUC header variant
+COL_DATOS_DTYPES = {
+    schema.COL_TIPO_REGISTRO: object,
+    schema.COL_TIPO_COMPROBANTE: object,
+    schema.COL_CONDICION_OPERACION: object,
+    schema.COL_IMPUTA_IRP: object,
+    schema.COL_NO_IMPUTAR: object,
+    schema.COL_RUC: object,
+    schema.COL_RUC_IVA: object,
+    schema.COL_RUC2: object,
+    schema.COL_RUC_EGRESOS: object,
+    schema.COL_FECHA_EMISION: object,
+    schema.COL_TIMBRADO: object,
+    schema.COL_NUMERO_COMPROBANTE: object,
+    schema.COL_MONTO_10: "float64",
+    schema.COL_MONTO_5: "float64",
+    schema.COL_MONTO_0: "float64",
+    schema.COL_TOTAL_COMPROBANTE: "float64",
+}
+
+
+@profiling.profiled("read_workbook")
+def read_workbook(xls_file_path, cache_dir=None):
+    if cache_dir is None:
+        return xlsx_stream.read_columns(xls_file_path, COL_DATOS_DTYPES, sheet_name="Datos")
+
+    key = workbook_cache.cache_key(xls_file_path, COL_DATOS_DTYPES)
+    data = workbook_cache.load(cache_dir, key)
+    if data is None:
+        data = xlsx_stream.read_columns(xls_file_path, COL_DATOS_DTYPES, sheet_name="Datos")
+        workbook_cache.store(cache_dir, key, data)
+    else:
+        logging.debug(f"Using cached {xls_file_path}")
+
+    return data
+
+
+@profiling.profiled("partition_tipo_registro")
+def partition_tipo_registro(data):
+    # one categorical pass over COL_TIPO_REGISTRO: rows of an unknown type (code -1) are kept in every partition,
+    # same as the previous "not any of the other types" filters did
+    codes = pd.Categorical(data[COL_TIPO_REGISTRO], categories=COL_TIPO_TODOS).codes
+    order = np.argsort(codes, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(codes + 1, minlength=len(COL_TIPO_TODOS) + 1))])
+
+    unknown_rows = order[bounds[0]:bounds[1]]
+
+    partitions = {}
+    for i, tipo in enumerate(COL_TIPO_TODOS):
+        rows = order[bounds[i + 1]:bounds[i + 2]]
+        if unknown_rows.size:
+            rows = np.sort(np.concatenate([rows, unknown_rows]))
+        partitions[tipo] = data.take(rows)
+
+    return partitions
+
+
+def list_workbooks(path):
+    xls_file_paths = []
+    for xls_file_path in sorted(pathlib.Path(path).glob("*.xlsx")):
+        if os.path.basename(xls_file_path).startswith("~$"):
+            continue  # ignore xlsx file metadata
+
+        xls_file_paths.append(xls_file_path)
+    return xls_file_paths
+
+
+@profiling.profiled("load_data")
+def load_data(path, workers=None, cache_dir=None, cache_max_bytes=workbook_cache.CACHE_MAX_BYTES,
+              duplicates=dedup.DUPLICATES_REPORT, duplicates_output=None):
+    xls_file_paths = list_workbooks(path)
+    for xls_file_path in xls_file_paths:
+        logging.info(f"Loading {xls_file_path}")
+
+    total_loaded = len(xls_file_paths)
+    workers = min(workers or os.cpu_count() or 1, max(total_loaded, 1))
+
+    # parsing is CPU-bound pure python, so spread the workbooks over processes;
+    # executor.map keeps the results in the same (sorted) order as the paths
+    read = partial(read_workbook, cache_dir=cache_dir)
+    if workers > 1:
+        lazy.preload()
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            if profiling.enabled:
+                datas = profiling.gather(executor.map(partial(profiling.collect, read), xls_file_paths))
+            else:
+                datas = list(executor.map(read, xls_file_paths))
+    else:
+        datas = [read(xls_file_path) for xls_file_path in xls_file_paths]
+
+    if cache_dir is not None:
+        workbook_cache.evict(cache_dir, cache_max_bytes)
+
+    # overlapping exports repeat comprobantes, every row keeps the name of its workbook for the report
+    data = pd.concat(datas)
+    data[schema.COL_ARCHIVO] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(datas)), [len(part) for part in datas]),
+        categories=[xls_file_path.name for xls_file_path in xls_file_paths])
+
+    data = dedup.deduplicate(schema.conform(data), duplicates=duplicates, report_path=duplicates_output)
+    partitions = partition_tipo_registro(data)
+
+    compras = partitions["COMPRAS"]
+    ventas = partitions["VENTAS"]
+    egresos = partitions["EGRESOS"]
+    ingresos = partitions["INGRESOS"]
+
+    logging.info(f"Loaded {total_loaded} total documents")
+
+    return compras, ventas, egresos, ingresos
+
+
+def add_arguments(parser):
+    profiling.add_arguments(parser)
+    parser.add_argument('--path', type=str, default="data")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processes used to parse the workbooks")
+    parser.add_argument('--cache-dir', type=str, default=None, help="directory where parsed workbooks are cached")
+    parser.add_argument('--cache-max-mb', type=int, default=workbook_cache.CACHE_MAX_BYTES >> 20)
+    parser.add_argument('--clear-cache', action="store_true", help="invalidate every cached workbook before loading")
+    parser.add_argument('--duplicates', choices=dedup.DUPLICATES_MODES, default=dedup.DUPLICATES_REPORT,
+                        help="what to do with comprobantes found in more than one row, drop only drops exact copies")
+    parser.add_argument('--duplicates-output', type=str, default=None, help="csv listing every duplicated comprobante")
+    parser.add_argument('--memory-report', action="store_true", help="log the memory used by the loaded frames")
+
+
+def load_args(args):
+    profiling.start(args)
+
+    if args.clear_cache and args.cache_dir is not None:
+        logging.info(f"Removed {workbook_cache.invalidate(args.cache_dir)} cached workbooks")
+
+    compras, ventas, egresos, ingresos = load_data(args.path, workers=args.workers, cache_dir=args.cache_dir,
+                                                   cache_max_bytes=args.cache_max_mb << 20, duplicates=args.duplicates,
+                                                   duplicates_output=args.duplicates_output)
+
+    if args.memory_report:
+        schema.memory_report({"compras": compras, "ventas": ventas, "egresos": egresos, "ingresos": ingresos})
+
+    return compras, ventas, egresos, ingresos
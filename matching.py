@@ -0,0 +1,149 @@
+import argparse
+import logging
+import pathlib
+import dataclasses
+import lazy
+import loader
+import profiling
+import schema
+from schema import COL_CONDICION_OPERACION, COL_TIPO_COMPROBANTE, COL_NUMERO_COMPROBANTE, COL_TOTAL_COMPROBANTE
+from schema import COL_RUC, COL_RUC_EGRESOS
+from aggregate import CONDICION_CREDITO, TIPO_COMPROBANTE_EGRESO_CREDITO
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.DEBUG)
+
+STATUS_PAID = "paid"
+STATUS_PARTIAL = "partial"
+STATUS_UNPAID = "unpaid"
+STATUS_OVERPAID = "overpaid"
+STATUS_NO_COMPRA = "no_compra"
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class CreditMatches:
+    # one row per (RUC, comprobante number), compras and payments of the same key are summed
+    matched: "pd.DataFrame"
+    unmatched_compras: "pd.DataFrame"
+    unmatched_egresos: "pd.DataFrame"
+    overpaid: "pd.DataFrame"
+
+
+def comprobante_numbers(values):
+    # "001-001-0000123" and "0010010000123" are the same number, only the digits are compared;
+    # the distinct numbers are cleaned once and the rows take theirs through the factorize codes
+    codes, uniques = pd.factorize(values.to_numpy())
+    digits = pd.Series(uniques, dtype=object).astype(str).str.replace(r"\D", "", regex=True)
+    digits = digits.where(digits != "", None).to_numpy(dtype=object)
+    return np.append(digits, [None])[codes]
+
+
+def comprobante_keys(data, col_ruc):
+    return pd.DataFrame({
+        "ruc": data[col_ruc].astype(object).to_numpy(),
+        "numero": comprobante_numbers(data[COL_NUMERO_COMPROBANTE]),
+    })
+
+
+def sum_by_code(codes, values, total_codes):
+    sums = np.zeros(total_codes, dtype=np.int64)
+    grouped = pd.Series(values, dtype=np.int64).groupby(codes).sum()
+    sums[grouped.index.to_numpy()] = grouped.to_numpy()
+    return sums
+
+
+@profiling.profiled("match_credit")
+def match_credit(compras, egresos):
+    credit = compras[compras[COL_CONDICION_OPERACION].isin(CONDICION_CREDITO).to_numpy()]
+    payments = egresos[(egresos[COL_TIPO_COMPROBANTE] == TIPO_COMPROBANTE_EGRESO_CREDITO).to_numpy()]
+
+    compras_keys = comprobante_keys(credit, COL_RUC)
+    egresos_keys = comprobante_keys(payments, COL_RUC_EGRESOS)
+
+    # a key needs both parts, rows missing one of them cannot be linked to anything
+    compras_linkable = compras_keys.notna().all(axis=1).to_numpy()
+    egresos_linkable = egresos_keys.notna().all(axis=1).to_numpy()
+    if not compras_linkable.all() or not egresos_linkable.all():
+        logging.warning(f"Skipped {(~compras_linkable).sum()} credit compras and {(~egresos_linkable).sum()} egresos "
+                        f"without RUC or comprobante number")
+    credit, compras_keys = credit[compras_linkable], compras_keys[compras_linkable]
+    payments, egresos_keys = payments[egresos_linkable], egresos_keys[egresos_linkable]
+
+    # hash join: the keys of both sides are hashed and factorized together, so the same key gets the same code
+    # on both sides; everything after this is a linear pass over the codes
+    keys = pd.concat([compras_keys, egresos_keys], ignore_index=True)
+    codes, uniques = pd.factorize(pd.util.hash_pandas_object(keys, index=False).to_numpy())
+    compras_codes, egresos_codes = codes[:len(compras_keys)], codes[len(compras_keys):]
+    total_codes = len(uniques)
+
+    # the RUC and number of every key are taken from its first row; factorize numbers the keys in order of first
+    # appearance, so the first indexes np.unique returns are already in code order
+    first_rows = np.unique(codes, return_index=True)[1]
+    result = keys.take(first_rows).reset_index(drop=True)
+
+    result["compras"] = np.bincount(compras_codes, minlength=total_codes)
+    result["compras_total"] = sum_by_code(compras_codes, credit[COL_TOTAL_COMPROBANTE].to_numpy(), total_codes)
+    result["payments"] = np.bincount(egresos_codes, minlength=total_codes)
+    result["paid_total"] = sum_by_code(egresos_codes, payments[COL_TOTAL_COMPROBANTE].to_numpy(), total_codes)
+    result["pending"] = result["compras_total"] - result["paid_total"]
+
+    # payments of a purchase can be spread over several months, they are compared as yyyymm integers since a
+    # groupby min / max of strings runs in python
+    fechas = schema.emission_dates(payments)
+    months = (fechas.dt.year * 100 + fechas.dt.month).fillna(0).to_numpy(dtype=np.int64)
+    dated = months > 0
+    month_range = pd.Series(months[dated]).groupby(egresos_codes[dated]).agg(["min", "max"])
+    month_range = month_range.reindex(range(total_codes), fill_value=0)
+    result["first_payment"] = schema.month_text(month_range["min"].to_numpy())
+    result["last_payment"] = schema.month_text(month_range["max"].to_numpy())
+
+    has_compras, has_payments = result["compras"].to_numpy() > 0, result["payments"].to_numpy() > 0
+    pending = result["pending"].to_numpy()
+    result["status"] = np.select(
+        [~has_payments, ~has_compras, pending < 0, pending == 0],
+        [STATUS_UNPAID, STATUS_NO_COMPRA, STATUS_OVERPAID, STATUS_PAID],
+        default=STATUS_PARTIAL,
+    )
+
+    status = result["status"]
+    return CreditMatches(
+        matched=result[status.isin([STATUS_PAID, STATUS_PARTIAL])].reset_index(drop=True),
+        unmatched_compras=result[status == STATUS_UNPAID].reset_index(drop=True),
+        unmatched_egresos=result[status == STATUS_NO_COMPRA].reset_index(drop=True),
+        overpaid=result[status == STATUS_OVERPAID].reset_index(drop=True),
+    )
+
+
+def log_matches(matches):
+    logging.info("")
+
+    logging.info(f"Matched credit compras: {len(matches.matched)}, "
+                 f"paid {matches.matched['paid_total'].sum():,} Gs, pending {matches.matched['pending'].sum():,} Gs")
+    logging.info(f"Unpaid credit compras: {len(matches.unmatched_compras)}, "
+                 f"{matches.unmatched_compras['compras_total'].sum():,} Gs")
+    logging.info(f"Egresos without credit compra: {len(matches.unmatched_egresos)}, "
+                 f"{matches.unmatched_egresos['paid_total'].sum():,} Gs")
+    logging.info(f"Overpaid credit compras: {len(matches.overpaid)}, "
+                 f"{-matches.overpaid['pending'].sum():,} Gs over")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    loader.add_arguments(parser)
+    parser.add_argument('--output-dir', type=str, default="matches", help="where the matched / unmatched csvs go")
+    args = parser.parse_args()
+
+    compras, ventas, egresos, ingresos = loader.load_args(args)
+
+    matches = match_credit(compras, egresos)
+    log_matches(matches)
+
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for field in dataclasses.fields(matches):
+        getattr(matches, field.name).to_csv(output_dir / f"{field.name}.csv", index=False)
+    logging.info(f"Wrote the matches to {output_dir}")
+
+    profiling.finish(args)
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import logging
+import cProfile
+import datetime
+import functools
+import lazy
+
+pd = lazy.load("pandas")
+
+try:
+    import resource
+except ImportError:  # not available on windows, peak RSS is then left out of the report
+    resource = None
+
+enabled = False
+records = []
+profiler = None
+started = None
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def count_rows(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (tuple, list)) and value and all(isinstance(item, pd.DataFrame) for item in value):
+        return sum(len(item) for item in value)
+    return None
+
+
+def profiled(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # a single flag check is all it costs when --profile is off
+            if not enabled:
+                return func(*args, **kwargs)
+
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            result = func(*args, **kwargs)
+
+            rows_in = [rows for rows in map(count_rows, args) if rows is not None]
+            # ru_maxrss never goes down, it is the peak of the whole process up to the end of the stage rather than
+            # the memory the stage itself used
+            records.append({
+                "stage": stage,
+                "detail": str(args[0]) if args and isinstance(args[0], (str, os.PathLike)) else None,
+                "pid": os.getpid(),
+                "wall_seconds": time.perf_counter() - wall_start,
+                "cpu_seconds": time.process_time() - cpu_start,
+                "process_peak_rss_bytes": peak_rss_bytes(),
+                "rows_in": sum(rows_in) if rows_in else None,
+                "rows_out": count_rows(result),
+            })
+
+            return result
+        return wrapper
+    return decorator
+
+
+def collect(func, *args):
+    # runs inside a pool worker, the records are handed back to the parent together with the result
+    global enabled
+    enabled = True
+    del records[:]
+    result = func(*args)
+    return result, list(records)
+
+
+def gather(collected):
+    results = []
+    for result, worker_records in collected:
+        records.extend(worker_records)
+        results.append(result)
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action="store_true", help="record time, cpu and memory of every stage")
+    parser.add_argument('--profile-output', type=str, default="profile.json", help="json report written by --profile")
+    parser.add_argument('--cprofile', type=str, default=None, help="also dump cProfile stats of the run to this file")
+
+
+def start(args):
+    global enabled, profiler, started
+    if not args.profile:
+        return
+
+    enabled = True
+    started = time.perf_counter()
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+def finish(args):
+    if not enabled:
+        return
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        logging.info(f"Wrote cProfile stats to {args.cprofile}")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv,
+        "total_wall_seconds": time.perf_counter() - started,
+        "process_peak_rss_bytes": peak_rss_bytes(),
+        "stages": records,
+    }
+    with open(args.profile_output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    logging.info(f"Wrote profile of {len(records)} stages to {args.profile_output}")
@@ -0,0 +1,133 @@
+import os
+import csv
+import hashlib
+import logging
+import dataclasses
+import lazy
+import workbook_cache
+from settings import RUCS_EGRESOS_ACTIV_GRAVADA, RUCS_ESTADO_ASOCIACIONES
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+REGISTRY_FILE_NAME = "rucs.csv"
+REGISTRY_CACHE_COLUMNS = ("registry", "ruc", "code")
+
+CODE_NONE = 0
+CODE_ACTIV_GRAVADA = 1
+CODE_ESTADO_ASOCIACIONES = 2
+
+CATEGORY_CODES = {
+    "activ_gravada": CODE_ACTIV_GRAVADA,
+    "estado_asociaciones": CODE_ESTADO_ASOCIACIONES,
+}
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class RucRegistry:
+    # sorted RUC numbers and the category code of each one
+    rucs: "np.ndarray"
+    codes: "np.ndarray"
+
+    def classify(self, values):
+        # only the distinct RUCs of the categorical column are looked up, rows take the code of their RUC
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")
+        categories = values.cat.categories.astype(str)
+
+        is_number = np.asarray(categories.str.fullmatch(r"\d{1,18}"), dtype=bool)
+        numbers = np.zeros(len(categories), dtype=np.int64)
+        numbers[is_number] = categories[is_number].astype(np.int64)
+
+        positions = np.minimum(np.searchsorted(self.rucs, numbers), max(len(self.rucs) - 1, 0))
+        if len(self.rucs):
+            found = is_number & (self.rucs[positions] == numbers)
+            category_codes = np.where(found, self.codes[positions], CODE_NONE).astype(np.int8)
+        else:
+            category_codes = np.full(len(categories), CODE_NONE, dtype=np.int8)
+
+        # missing RUCs have code -1, which picks the appended CODE_NONE
+        return np.append(category_codes, np.int8(CODE_NONE))[values.cat.codes.to_numpy()]
+
+    def digest(self):
+        # identifies the classification, sums computed with a different one cannot be reused
+        return hashlib.blake2b(self.rucs.tobytes() + self.codes.tobytes(), digest_size=8).hexdigest()
+
+
+def build_registry(entries):
+    codes_by_ruc = {}
+    for ruc, code in entries:
+        if codes_by_ruc.setdefault(ruc, code) != code:
+            raise ValueError(f"RUC {ruc} is registered under more than one category")
+
+    rucs = np.fromiter(codes_by_ruc, dtype=np.int64, count=len(codes_by_ruc))
+    codes = np.fromiter(codes_by_ruc.values(), dtype=np.int8, count=len(codes_by_ruc))
+    order = np.argsort(rucs)
+
+    return RucRegistry(rucs=rucs[order], codes=codes[order])
+
+
+def from_settings():
+    entries = [(int(ruc), CODE_ACTIV_GRAVADA) for ruc in RUCS_EGRESOS_ACTIV_GRAVADA]
+    entries += [(int(ruc), CODE_ESTADO_ASOCIACIONES) for ruc in RUCS_ESTADO_ASOCIACIONES]
+    return build_registry(entries)
+
+
+def read_registry(registry_path):
+    # csv with a "ruc,category" header, any other column (such as a name) is ignored
+    entries = []
+    with open(registry_path, encoding="utf-8", newline="") as f:
+        for line_number, line in enumerate(csv.DictReader(f), start=2):
+            ruc, category = line["ruc"].strip(), line["category"].strip()
+            if not ruc.isdigit():
+                raise ValueError(f"{registry_path}:{line_number}: invalid RUC {ruc!r}")
+            if category not in CATEGORY_CODES:
+                raise ValueError(f"{registry_path}:{line_number}: unknown category {category!r}")
+            entries.append((int(ruc), CATEGORY_CODES[category]))
+
+    return build_registry(entries)
+
+
+def resolve_registry_path(registry_path=None, data_path=None):
+    # an explicit file wins, then the rucs.csv of the taxpayer directory, then the lists in settings.py (None)
+    if registry_path is None and data_path is not None and os.path.exists(os.path.join(data_path, REGISTRY_FILE_NAME)):
+        registry_path = os.path.join(data_path, REGISTRY_FILE_NAME)
+    return registry_path
+
+
+def source_digest(registry_path=None, data_path=None):
+    # identifies the classification load_registry would return without reading it or importing numpy
+    registry_path = resolve_registry_path(registry_path, data_path)
+    if registry_path is None:
+        lists = repr((RUCS_EGRESOS_ACTIV_GRAVADA, RUCS_ESTADO_ASOCIACIONES)).encode()
+        return f"settings-{hashlib.blake2b(lists, digest_size=8).hexdigest()}"
+    return workbook_cache.cache_key(registry_path, REGISTRY_CACHE_COLUMNS)
+
+
+def load_registry(registry_path=None, data_path=None, cache_dir=None):
+    registry_path = resolve_registry_path(registry_path, data_path)
+    if registry_path is None:
+        return from_settings()
+
+    if cache_dir is None:
+        return read_registry(registry_path)
+
+    key = workbook_cache.cache_key(registry_path, REGISTRY_CACHE_COLUMNS)
+    index = workbook_cache.load(cache_dir, key)
+    if index is not None:
+        logging.debug(f"Using cached {registry_path}")
+        return RucRegistry(rucs=index["ruc"].to_numpy(dtype=np.int64), codes=index["code"].to_numpy(dtype=np.int8))
+
+    registry = read_registry(registry_path)
+    workbook_cache.store(cache_dir, key, pd.DataFrame({"ruc": registry.rucs, "code": registry.codes}))
+
+    return registry
+
+
+def add_arguments(parser):
+    parser.add_argument('--registry', type=str, default=None,
+                        help=f"csv with the RUC classifications, defaults to {REGISTRY_FILE_NAME} in --path or settings.py")
+
+
+def load_args(args):
+    return load_registry(args.registry, data_path=args.path, cache_dir=args.cache_dir)
@@ -0,0 +1,249 @@
+import os
+import argparse
+import logging
+import pathlib
+import sqlite3
+import lazy
+import schema
+import loader
+import profiling
+import registry
+import aggregate
+import dedup
+import csv_stream
+import workbook_cache
+from functools import partial
+from concurrent import futures
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.DEBUG)
+
+ROLLUP_DB = "rollups.sqlite"
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    directory TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    cache_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    file_id INTEGER NOT NULL REFERENCES files (file_id) ON DELETE CASCADE,
+    month TEXT NOT NULL,
+    section TEXT NOT NULL,
+    name TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (file_id, month, section, name)
+);
+"""
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(ROLLUP_SCHEMA)
+    return connection
+
+
+def flatten_sums(sums, section=""):
+    # the nested partial sums of aggregate.form_partials as (section, name, total) rows, e.g. ("iva", "total_egresos")
+    # or ("irp_rsp/compras", "65") where the name is a flag combination
+    for key, value in sums.items():
+        if isinstance(value, dict):
+            yield from flatten_sums(value, f"{section}/{key}" if section else str(key))
+        else:
+            yield section, str(key), int(value)
+
+
+def unflatten_sums(rows):
+    sums = {}
+    for section, name, total in rows:
+        parent = sums
+        for key in section.split("/"):
+            parent = parent.setdefault(key, {})
+        parent[int(name) if name.isdigit() else name] = total
+    return sums
+
+
+def month_partials(data, ruc_registry):
+    # every row belongs to exactly one month, so the months of a file add up to the file
+    months = schema.emission_months(data).to_numpy()
+
+    partials = {}
+    for month in sorted(set(months)):
+        partitions = loader.partition_tipo_registro(data[months == month])
+        partials[month] = aggregate.form_partials(partitions["COMPRAS"], partitions["VENTAS"], partitions["EGRESOS"],
+                                                  ruc_registry)
+
+    return partials
+
+
+def month_rows(partials):
+    return [(month, section, name, total)
+            for month in sorted(partials) for section, name, total in flatten_sums(partials[month])]
+
+
+@profiling.profiled("rollup_workbook")
+def rollup_workbook(xls_file_path, ruc_registry, cache_dir=None):
+    data = schema.conform(loader.read_workbook(xls_file_path, cache_dir=cache_dir))
+    return month_rows(month_partials(data, ruc_registry))
+
+
+@profiling.profiled("rollup_export")
+def rollup_export(csv_file_path, ruc_registry, chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING,
+                  thousands=None):
+    # reduced chunk by chunk like csv_stream.reduce_export, keeping the months apart
+    partials = {}
+    for chunk in csv_stream.read_chunks(csv_file_path, chunk_rows=chunk_rows, encoding=encoding, thousands=thousands):
+        partials = aggregate.merge_sums([partials, month_partials(schema.conform(chunk), ruc_registry)])
+
+    return month_rows(partials)
+
+
+def rollup_file(file_path, ruc_registry, cache_dir=None, chunk_rows=csv_stream.CSV_CHUNK_ROWS,
+                encoding=csv_stream.CSV_ENCODING, thousands=None):
+    if pathlib.Path(file_path).suffix.lower() in csv_stream.CSV_SUFFIXES:
+        return rollup_export(file_path, ruc_registry, chunk_rows=chunk_rows, encoding=encoding, thousands=thousands)
+    return rollup_workbook(file_path, ruc_registry, cache_dir=cache_dir)
+
+
+def update(connection, path, registry_path=None, workers=None, cache_dir=None, csv_file_paths=None,
+           chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING, thousands=None):
+    # the csv/txt exports of the directory are kept next to its workbooks, so the store sums the same files a full
+    # run reads
+    directory = str(pathlib.Path(path).resolve())
+    if csv_file_paths is None:
+        csv_file_paths = csv_stream.list_exports(path)
+
+    stored_keys = dict(connection.execute("SELECT path, cache_key FROM files WHERE directory = ?", (directory,)))
+
+    # the RUC classification is part of the key, the IRP-RSP sums of another registry cannot be reused; it is
+    # identified by its source, the registry itself is only built when a workbook has to be parsed
+    registry_digest = registry.source_digest(registry_path, data_path=path)
+    current_keys = {}
+    for xls_file_path in loader.list_workbooks(path):
+        key = workbook_cache.cache_key(xls_file_path, loader.COL_DATOS_DTYPES)
+        current_keys[str(xls_file_path.resolve())] = f"{key}-{registry_digest}"
+    for csv_file_path in csv_file_paths:
+        # the encoding and separators change how an export is parsed, so they are part of its key
+        key = workbook_cache.cache_key(csv_file_path, [*loader.COL_DATOS_DTYPES, f"{encoding}|{thousands}"])
+        current_keys[str(csv_file_path.resolve())] = f"{key}-{registry_digest}"
+
+    removed = [file_path for file_path in stored_keys if file_path not in current_keys]
+    changed = [file_path for file_path, key in current_keys.items() if stored_keys.get(file_path) != key]
+
+    for file_path in removed:
+        logging.info(f"Removing rollups of {file_path}")
+    for file_path in changed:
+        logging.info(f"Loading {file_path}")
+
+    workers = min(workers or os.cpu_count() or 1, max(len(changed), 1))
+    if changed:
+        ruc_registry = registry.load_registry(registry_path, data_path=path, cache_dir=cache_dir)
+        rollup = partial(rollup_file, ruc_registry=ruc_registry, cache_dir=cache_dir, chunk_rows=chunk_rows,
+                         encoding=encoding, thousands=thousands)
+    if not changed:
+        file_rows = []
+    elif workers > 1:
+        lazy.preload()
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            if profiling.enabled:
+                file_rows = profiling.gather(executor.map(partial(profiling.collect, rollup), changed))
+            else:
+                file_rows = list(executor.map(rollup, changed))
+    else:
+        file_rows = [rollup(file_path) for file_path in changed]
+
+    # a file is replaced together with its rollups, a failed run leaves the previous state
+    with connection:
+        connection.executemany("DELETE FROM files WHERE path = ?", [(file_path,) for file_path in removed + changed])
+        for file_path, rows in zip(changed, file_rows):
+            file_id = connection.execute("INSERT INTO files (directory, path, cache_key) VALUES (?, ?, ?)",
+                                         (directory, file_path, current_keys[file_path])).lastrowid
+            connection.executemany("INSERT INTO rollups (file_id, month, section, name, total) VALUES (?, ?, ?, ?, ?)",
+                                   [(file_id, *row) for row in rows])
+
+    logging.info(f"Loaded {len(changed)} changed documents, reused {len(current_keys) - len(changed)}")
+
+
+def sum_rollups(connection, path, by_month=False):
+    directory = str(pathlib.Path(path).resolve())
+    month = "rollups.month" if by_month else "''"
+    rows = connection.execute(f"""
+        SELECT {month}, rollups.section, rollups.name, SUM(rollups.total)
+        FROM rollups JOIN files ON files.file_id = rollups.file_id
+        WHERE files.directory = ?
+        GROUP BY 1, 2, 3
+        ORDER BY 1
+    """, (directory,)).fetchall()
+
+    partials_by_month = {}
+    for month, section, name, total in rows:
+        partials_by_month.setdefault(month, []).append((section, name, total))
+
+    return {month: unflatten_sums(rows) for month, rows in partials_by_month.items()}
+
+
+@profiling.profiled("load_rollups")
+def load_partials(path, registry_path=None, db_path=ROLLUP_DB, workers=None, cache_dir=None, csv_file_paths=None,
+                  chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING, thousands=None):
+    connection = connect(db_path)
+    try:
+        update(connection, path, registry_path=registry_path, workers=workers, cache_dir=cache_dir,
+               csv_file_paths=csv_file_paths, chunk_rows=chunk_rows, encoding=encoding, thousands=thousands)
+        partials = sum_rollups(connection, path).get("")
+    finally:
+        connection.close()
+
+    if partials is None:
+        raise FileNotFoundError(f"No rows to sum in {path}, it has no workbooks or exports with data")
+
+    return partials
+
+
+def add_arguments(parser):
+    parser.add_argument('--rollup-db', type=str, default=None,
+                        help="sqlite file keeping the sums of every workbook and export, only changed ones are parsed")
+
+
+def check_args(parser, args):
+    # the rollups of every file are kept apart, what needs all the rows of the directory at once cannot be done
+    if args.rollup_db is None:
+        return
+    if args.duplicates == dedup.DUPLICATES_DROP:
+        parser.error("--duplicates drop needs every workbook at once and cannot be combined with --rollup-db")
+    if args.duplicates_output is not None:
+        parser.error("--duplicates-output needs every workbook at once and cannot be combined with --rollup-db")
+    if args.memory_report:
+        parser.error("--memory-report needs the loaded frames and cannot be combined with --rollup-db")
+
+
+def load_args(args, csv_file_paths=None):
+    if args.clear_cache and args.cache_dir is not None:
+        logging.info(f"Removed {workbook_cache.invalidate(args.cache_dir)} cached workbooks")
+    if args.duplicates != dedup.DUPLICATES_KEEP:
+        logging.info("Duplicated comprobantes are not looked for across the files kept in the rollup store")
+
+    return load_partials(args.path, registry_path=args.registry, db_path=args.rollup_db, workers=args.workers,
+                         cache_dir=args.cache_dir, csv_file_paths=csv_file_paths, chunk_rows=args.chunk_rows,
+                         encoding=args.csv_encoding, thousands=args.csv_thousands)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    loader.add_arguments(parser)
+    registry.add_arguments(parser)
+    csv_stream.add_arguments(parser)
+    parser.add_argument('--db', type=str, default=ROLLUP_DB)
+    args = parser.parse_args()
+
+    profiling.start(args)
+
+    # refreshes the store and logs the IVA figures of every month of emission
+    connection = connect(args.db)
+    update(connection, args.path, registry_path=args.registry, workers=args.workers, cache_dir=args.cache_dir,
+           chunk_rows=args.chunk_rows, encoding=args.csv_encoding, thousands=args.csv_thousands)
+    for month, partials in sum_rollups(connection, args.path, by_month=True).items():
+        logging.info(f"Month {month or 'unknown'}")
+        aggregate.log_iva_totals(aggregate.finish_iva(partials["iva"]))
+    connection.close()
+
+    profiling.finish(args)
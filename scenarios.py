@@ -0,0 +1,145 @@
+import argparse
+import logging
+import itertools
+import dataclasses
+import lazy
+import loader
+import profiling
+import registry
+import aggregate
+import schema
+from schema import COL_CONDICION_OPERACION, COL_IMPUTA_IRP, COL_RUC, COL_RUC_EGRESOS, COL_TOTAL_COMPROBANTE
+from registry import CODE_ACTIV_GRAVADA, CODE_ESTADO_ASOCIACIONES
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.DEBUG)
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class ScenarioBase:
+    total_ventas: int
+    total_compras: int
+    total_egresos: int
+    # deductible compras and egresos amounts of every RUC, and the category code the registry gives it
+    rucs: "pd.Index"
+    compras_amounts: "np.ndarray"
+    egresos_amounts: "np.ndarray"
+    codes: "np.ndarray"
+
+
+def deductible_by_ruc(data, col_ruc, keep):
+    amounts = data.loc[keep, [col_ruc, COL_TOTAL_COMPROBANTE]].groupby(col_ruc, observed=True)[COL_TOTAL_COMPROBANTE].sum()
+    amounts.index = amounts.index.astype(str)
+    return amounts
+
+
+@profiling.profiled("prepare_scenarios")
+def prepare(compras, ventas, egresos, ruc_registry):
+    # the only pass over the rows, every scenario is then evaluated from these per RUC sums
+    compras_keep = ~compras[COL_CONDICION_OPERACION].isin(aggregate.CONDICION_CREDITO).to_numpy()
+    compras_keep &= (compras[COL_IMPUTA_IRP] != "NO").to_numpy()
+    egresos_keep = (egresos[COL_IMPUTA_IRP] != "NO").to_numpy()
+
+    by_ruc = pd.DataFrame({
+        "compras": deductible_by_ruc(compras, COL_RUC, compras_keep),
+        "egresos": deductible_by_ruc(egresos, COL_RUC_EGRESOS, egresos_keep),
+    }).fillna(0).astype(np.int64)
+
+    totals = aggregate.aggregate_irp_rsp(compras, ventas, egresos, ruc_registry)
+
+    return ScenarioBase(
+        total_ventas=totals.total_ventas,
+        total_compras=totals.total_compras,
+        total_egresos=totals.total_egresos,
+        rucs=by_ruc.index,
+        compras_amounts=by_ruc["compras"].to_numpy(),
+        egresos_amounts=by_ruc["egresos"].to_numpy(),
+        codes=ruc_registry.classify(pd.Series(by_ruc.index, dtype="category")),
+    )
+
+
+@profiling.profiled("evaluate_scenarios")
+def evaluate(base, gastos_salud_educ=0, gastos_vehiculos_cada_3y=0, reclassified_rucs=(), reclassified_codes=None):
+    # the gastos are scalars or arrays with one value per scenario, reclassified_codes has one row per scenario and
+    # one column per entry of reclassified_rucs with the registry code that RUC gets in that scenario
+    if reclassified_codes is None or not len(reclassified_rucs):
+        reclassified_rucs, reclassified_codes = (), np.zeros((1, 0), dtype=np.int8)
+    else:
+        reclassified_codes = np.asarray(reclassified_codes).reshape(-1, len(reclassified_rucs))
+
+    gastos_salud_educ, gastos_vehiculos_cada_3y = np.broadcast_arrays(
+        np.asarray(gastos_salud_educ, dtype=np.int64), np.asarray(gastos_vehiculos_cada_3y, dtype=np.int64))
+    total_scenarios = max(gastos_salud_educ.size, reclassified_codes.shape[0])
+    gastos_salud_educ = np.broadcast_to(gastos_salud_educ.ravel(), total_scenarios)
+    gastos_vehiculos_cada_3y = np.broadcast_to(gastos_vehiculos_cada_3y.ravel(), total_scenarios)
+    reclassified_codes = np.broadcast_to(reclassified_codes, (total_scenarios, len(reclassified_rucs)))
+
+    # RUCs without deductible amounts do not move any total
+    positions = base.rucs.get_indexer([schema.ruc_text(ruc) for ruc in reclassified_rucs])
+    present = positions >= 0
+    positions, reclassified_codes = positions[present], reclassified_codes[:, present]
+
+    base_codes = base.codes[positions]
+    compras_amounts = base.compras_amounts[positions]
+    egresos_amounts = base.egresos_amounts[positions]
+
+    def category_totals(code):
+        # base total of the category plus what each scenario moves in or out of it
+        moved = (reclassified_codes == code).astype(np.int64) - (base_codes == code).astype(np.int64)
+        compras_total = base.compras_amounts[base.codes == code].sum() + moved @ compras_amounts
+        egresos_total = base.egresos_amounts[base.codes == code].sum() + moved @ egresos_amounts
+        return compras_total, egresos_total
+
+    compras_activ_gravada, egresos_activ_gravada = category_totals(CODE_ACTIV_GRAVADA)
+    compras_estado_asoc, egresos_estado_asoc = category_totals(CODE_ESTADO_ASOCIACIONES)
+    egresos_activ_gravada = egresos_activ_gravada - gastos_vehiculos_cada_3y
+
+    total_gastos_activ_gravada = egresos_activ_gravada + compras_activ_gravada
+    total_gastos_estado_asoc = compras_estado_asoc + egresos_estado_asoc
+    total_gastos = base.total_compras + base.total_egresos
+    total_gastos_familiares = total_gastos - total_gastos_activ_gravada - gastos_salud_educ - total_gastos_estado_asoc - gastos_vehiculos_cada_3y
+
+    total_diff = np.full(total_scenarios, base.total_ventas - base.total_compras - base.total_egresos, dtype=np.int64)
+    irp_8p, irp_9p, irp_10p = aggregate.irp_brackets(total_diff)
+
+    return pd.DataFrame({
+        "gastos_salud_educ": gastos_salud_educ,
+        "gastos_vehiculo_cada_3y": gastos_vehiculos_cada_3y,
+        "total_egresos_activ_gravada": egresos_activ_gravada,
+        "total_compras_activ_gravada": compras_activ_gravada,
+        "total_egresos_estado_asoc": egresos_estado_asoc,
+        "total_compras_estado_asoc": compras_estado_asoc,
+        "total_gastos_activ_gravada": total_gastos_activ_gravada,
+        "total_gastos_estado_asoc": total_gastos_estado_asoc,
+        "total_gastos_familiares": total_gastos_familiares,
+        "total_gastos": total_gastos,
+        "total_diff": total_diff,
+        "irp_8p": irp_8p,
+        "irp_9p": irp_9p,
+        "irp_10p": irp_10p,
+        "total_irp": irp_8p + irp_9p + irp_10p,
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    loader.add_arguments(parser)
+    registry.add_arguments(parser)
+    parser.add_argument('--salud', type=int, nargs="+", default=[0], help="gastos exterior salud / educacion to try")
+    parser.add_argument('--vehiculos', type=int, nargs="+", default=[0], help="gastos vehiculos cada 3y to try")
+    parser.add_argument('--output', type=str, default="scenarios.csv")
+    args = parser.parse_args()
+
+    compras, ventas, egresos, ingresos = loader.load_args(args)
+    base = prepare(compras, ventas, egresos, registry.load_args(args))
+
+    # every combination of the given deduction values is one scenario
+    salud, vehiculos = zip(*itertools.product(args.salud, args.vehiculos))
+    results = evaluate(base, gastos_salud_educ=list(salud), gastos_vehiculos_cada_3y=list(vehiculos))
+    results.to_csv(args.output, index_label="scenario")
+
+    logging.info(f"Wrote {len(results)} scenarios to {args.output}")
+
+    profiling.finish(args)
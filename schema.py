@@ -0,0 +1,151 @@
+import logging
+import lazy
+import profiling
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+COL_IMPUTA_IRP = "Imputa IRP"
+COL_NO_IMPUTAR = "No Imputar"
+COL_TIPO_REGISTRO = "Tipo de Registro"
+COL_TIPO_COMPROBANTE = "Tipo de Comprobante"
+COL_CONDICION_OPERACION = "Condicion de la Operacion"
+COL_MONTO_10 = "Monto Gravado 10%"
+COL_MONTO_5 = "Monto Gravado 5%"
+COL_MONTO_0 = "Monto No Gravado / Exento "
+COL_TOTAL_COMPROBANTE = "Total Comprobante"
+COL_TIMBRADO = "Timbrado del Comprobante"
+COL_NUMERO_COMPROBANTE = "Numero de Comprobante"
+COL_FECHA_EMISION = "Fecha de Emision"
+COL_RUC = "RUC / Nº de Identificacion del Informado"
+COL_RUC_IVA = "RUC / N? de Identificacion del Informado"
+COL_RUC2 = "RUC del Informante"
+COL_RUC_EGRESOS = "RUC / N° de Identificación del Informado"
+
+# not part of the exports, the loader adds the name of the workbook every row was read from
+COL_ARCHIVO = "Archivo"
+
+# rows without a readable Fecha de Emision are kept under this month
+MONTH_UNKNOWN = ""
+
+DTYPE_RUC = "ruc"
+DTYPE_CATEGORY = "category"
+DTYPE_AMOUNT = "int64"
+
+# columns that are not listed here are passed through untouched
+COL_DTYPES = {
+    COL_TIPO_REGISTRO: DTYPE_CATEGORY,
+    COL_TIPO_COMPROBANTE: DTYPE_CATEGORY,
+    COL_CONDICION_OPERACION: DTYPE_CATEGORY,
+    COL_IMPUTA_IRP: DTYPE_CATEGORY,
+    COL_NO_IMPUTAR: DTYPE_CATEGORY,
+    COL_RUC: DTYPE_RUC,
+    COL_RUC_IVA: DTYPE_RUC,
+    COL_RUC2: DTYPE_RUC,
+    COL_RUC_EGRESOS: DTYPE_RUC,
+    # timbrados are numeric codes written either as numbers or as text, same as RUCs
+    COL_TIMBRADO: DTYPE_RUC,
+    COL_MONTO_10: DTYPE_AMOUNT,
+    COL_MONTO_5: DTYPE_AMOUNT,
+    COL_MONTO_0: DTYPE_AMOUNT,
+    COL_TOTAL_COMPROBANTE: DTYPE_AMOUNT,
+}
+
+
+def ruc_text(value):
+    # numeric cells come as 80081262 or 80081262.0, only a trailing ".0" of a number is dropped
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].isdigit():
+        return text[:-2]
+
+    return text
+
+
+def normalize_ruc(values):
+    # factorize first so only the distinct RUCs are turned into text, then map the row codes over
+    codes, uniques = pd.factorize(values.to_numpy())
+    text_codes, categories = pd.factorize(np.array([ruc_text(value) for value in uniques], dtype=object))
+
+    # missing RUCs keep code -1
+    codes = np.append(text_codes, -1)[codes]
+
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=values.index, name=values.name)
+
+
+def informado_rucs(data):
+    # the informado RUC comes under COL_RUC or under the iva.py header COL_RUC_IVA depending on the export, rows of
+    # workbooks using either of them are concatenated, so every row takes whichever of the two it has
+    present = [name for name in [COL_RUC, COL_RUC_IVA] if name in data]
+    if not present:
+        return pd.Series(None, index=data.index, dtype=object)
+
+    rucs = data[present[0]]
+    for name in present[1:]:
+        rucs = rucs.where(rucs.notna(), data[name])
+    return rucs
+
+
+def to_amount(values):
+    return pd.to_numeric(values).fillna(0).astype(DTYPE_AMOUNT)
+
+
+def emission_dates(data):
+    # workbook cells are dates, text exports write them as dd/mm/yyyy, anything else is NaT
+    if COL_FECHA_EMISION not in data:
+        return pd.Series(pd.NaT, index=data.index, dtype="datetime64[ns]")
+    return pd.to_datetime(data[COL_FECHA_EMISION], errors="coerce", dayfirst=True)
+
+
+def emission_months(data):
+    return emission_dates(data).dt.strftime("%Y-%m").fillna(MONTH_UNKNOWN)
+
+
+def month_text(months):
+    # yyyymm integers as "yyyy-mm", 0 is MONTH_UNKNOWN; there are only a few distinct months to format
+    codes, uniques = pd.factorize(np.asarray(months))
+    texts = np.array([f"{month // 100:04d}-{month % 100:02d}" if month else MONTH_UNKNOWN for month in uniques],
+                     dtype=object)
+    return texts[codes]
+
+
+@profiling.profiled("conform")
+def conform(data):
+    columns = {}
+    for name in data.columns:
+        dtype = COL_DTYPES.get(name)
+        if dtype == DTYPE_RUC:
+            columns[name] = normalize_ruc(data[name])
+        elif dtype == DTYPE_CATEGORY:
+            columns[name] = data[name].astype(DTYPE_CATEGORY)
+        elif dtype == DTYPE_AMOUNT:
+            columns[name] = to_amount(data[name])
+        else:
+            columns[name] = data[name]
+
+    # the forms only read COL_RUC and COL_RUC_EGRESOS, whatever headers the export used; a missing egresos RUC column
+    # is an empty one, which iva.py used to patch with "0"
+    if COL_RUC_IVA in data or COL_RUC not in data:
+        columns[COL_RUC] = normalize_ruc(informado_rucs(data))
+    if COL_RUC_EGRESOS not in data:
+        columns[COL_RUC_EGRESOS] = normalize_ruc(pd.Series(None, index=data.index, dtype=object))
+
+    return pd.DataFrame(columns, index=data.index)
+
+
+def memory_report(frames):
+    total_bytes = 0
+    for name, data in frames.items():
+        usage = data.memory_usage(index=True, deep=True)
+        total_bytes += usage.sum()
+
+        logging.info(f"Memory {name}: {len(data):,} rows, {usage.sum():,} bytes")
+        for column, column_bytes in usage.items():
+            dtype = data[column].dtype if column in data else data.index.dtype
+            logging.debug(f"  {column} ({dtype}): {column_bytes:,} bytes")
+
+    logging.info(f"Memory total: {total_bytes:,} bytes")
+
+    return total_bytes
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import http
+import asyncio
+import argparse
+import logging
+import pathlib
+import dataclasses
+import collections
+import urllib.parse
+import lazy
+import watch
+import registry
+import aggregate
+import csv_stream
+from concurrent import futures
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.INFO)
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_TAXPAYERS = 64
+
+
+@dataclasses.dataclass
+class Taxpayer:
+    # the partial sums of every workbook of the directory, keyed like watch.refresh expects them
+    registry_digest: str = ""
+    workbooks: dict = dataclasses.field(default_factory=dict)
+    lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock)
+
+
+class FormServer:
+    def __init__(self, root=None, max_taxpayers=SERVER_MAX_TAXPAYERS, workers=None, cache_dir=None,
+                 chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING, thousands=None):
+        self.root = pathlib.Path(root).resolve() if root is not None else None
+        self.max_taxpayers = max_taxpayers
+        self.cache_dir = cache_dir
+        # how the csv/txt exports of every taxpayer are parsed
+        self.csv_options = {"chunk_rows": chunk_rows, "encoding": encoding, "thousands": thousands}
+        # workbooks are parsed in a pool that lives as long as the server, its processes inherit pandas from here
+        lazy.preload()
+        self.executor = futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.taxpayers = collections.OrderedDict()
+
+    def resolve(self, path):
+        # with --root, taxpayer paths are relative to it and cannot leave it
+        if self.root is None:
+            return pathlib.Path(path).resolve()
+        resolved = (self.root / path).resolve()
+        if resolved != self.root and self.root not in resolved.parents:
+            raise PermissionError(f"{path} is outside of {self.root}")
+        return resolved
+
+    def taxpayer(self, path):
+        # least recently used taxpayers are dropped once there are more than max_taxpayers
+        taxpayer = self.taxpayers.pop(path, None) or Taxpayer()
+        self.taxpayers[path] = taxpayer
+        while len(self.taxpayers) > self.max_taxpayers:
+            self.taxpayers.popitem(last=False)
+        return taxpayer
+
+    def refresh(self, path, taxpayer):
+        ruc_registry = registry.load_registry(data_path=path, cache_dir=self.cache_dir)
+        if ruc_registry.digest() != taxpayer.registry_digest:
+            # the IRP-RSP sums depend on the classification, all of them are computed again
+            taxpayer.registry_digest = ruc_registry.digest()
+            taxpayer.workbooks.clear()
+
+        watch.refresh(taxpayer.workbooks, path, ruc_registry, cache_dir=self.cache_dir, executor=self.executor,
+                      **self.csv_options)
+
+    async def forms(self, path):
+        started = time.perf_counter()
+        path = self.resolve(path)
+        if not path.is_dir():
+            raise FileNotFoundError(f"{path} is not a directory")
+
+        # concurrent requests for the same taxpayer wait for a single refresh instead of parsing twice
+        taxpayer = self.taxpayer(path)
+        async with taxpayer.lock:
+            await asyncio.get_running_loop().run_in_executor(None, self.refresh, path, taxpayer)
+            loaded = [partials for _, partials in taxpayer.workbooks.values() if partials is not None]
+
+        if not loaded:
+            raise FileNotFoundError(f"no readable workbooks or exports in {path}")
+
+        iva_totals, irp_rsp_totals = aggregate.finish_forms(aggregate.merge_sums(loaded))
+        return {
+            "path": str(path),
+            "workbooks": len(loaded),
+            "iva": dataclasses.asdict(iva_totals),
+            "irp_rsp": dataclasses.asdict(irp_rsp_totals),
+            "seconds": time.perf_counter() - started,
+        }
+
+    async def dispatch(self, method, target):
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+
+        if method != "GET":
+            return http.HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} is not supported"}
+        if url.path == "/health":
+            return http.HTTPStatus.OK, {"status": "ok", "taxpayers": len(self.taxpayers)}
+        if url.path != "/forms":
+            return http.HTTPStatus.NOT_FOUND, {"error": f"unknown endpoint {url.path}"}
+        if "path" not in query:
+            return http.HTTPStatus.BAD_REQUEST, {"error": "missing the path of the taxpayer directory"}
+
+        try:
+            return http.HTTPStatus.OK, await self.forms(query["path"][0])
+        except PermissionError as e:
+            return http.HTTPStatus.FORBIDDEN, {"error": str(e)}
+        except FileNotFoundError as e:
+            return http.HTTPStatus.NOT_FOUND, {"error": str(e)}
+        except Exception as e:
+            logging.exception(f"Failed {target}")
+            return http.HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    async def handle(self, reader, writer):
+        # a minimal HTTP/1.1 exchange: one GET per connection, the headers are read and ignored
+        try:
+            request_line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.split(" ")
+            if len(parts) != 3:
+                status, body = http.HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}
+            else:
+                status, body = await self.dispatch(parts[0], parts[1])
+                logging.info(f"{parts[0]} {parts[1]} {status.value}")
+
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                         f"Content-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT, socket_path=None):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+            logging.info(f"Serving on {socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+            logging.info(f"Serving on http://{host}:{port}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--socket', type=str, default=None, help="listen on this unix socket instead of host:port")
+    parser.add_argument('--root', type=str, default=None, help="only serve taxpayer directories below this one")
+    parser.add_argument('--max-taxpayers', type=int, default=SERVER_MAX_TAXPAYERS, help="taxpayers kept in memory")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processes used to parse the workbooks")
+    parser.add_argument('--cache-dir', type=str, default=None, help="directory where parsed workbooks are cached")
+    csv_stream.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FormServer(root=args.root, max_taxpayers=args.max_taxpayers, workers=args.workers,
+                        cache_dir=args.cache_dir, chunk_rows=args.chunk_rows, encoding=args.csv_encoding,
+                        thousands=args.csv_thousands)
+    try:
+        asyncio.run(server.serve(host=args.host, port=args.port, socket_path=args.socket))
+    except KeyboardInterrupt:
+        logging.info("Stopped serving")
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import loader
+import profiling
+import registry
+import aggregate
+import csv_stream
+import rollup
+import watch
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.DEBUG)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    loader.add_arguments(parser)
+    registry.add_arguments(parser)
+    csv_stream.add_arguments(parser)
+    rollup.add_arguments(parser)
+    watch.add_arguments(parser)
+    args = parser.parse_args()
+
+    watch.check_args(parser, args)
+
+    if args.watch:
+        # runs until interrupted, only the workbooks and exports that changed since the previous poll are parsed again
+        try:
+            watch.watch_args(args, registry.load_args(args))
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
+        raise SystemExit(0)
+
+    rollup.check_args(parser, args)
+
+    # listed once, files that are not exports are warned about a single time
+    csv_file_paths = csv_stream.list_exports(args.path)
+
+    if args.rollup_db is not None:
+        # only new or changed workbooks and exports are parsed, the forms are the sum of the stored rollups; when
+        # nothing changed neither the registry nor any file is parsed and pandas is never imported
+        profiling.start(args)
+        iva_totals, irp_rsp_totals = aggregate.finish_forms(rollup.load_args(args, csv_file_paths))
+    elif csv_file_paths:
+        # csv/txt exports are reduced chunk by chunk to the partial sums of both forms
+        profiling.start(args)
+        ruc_registry = registry.load_args(args)
+        iva_totals, irp_rsp_totals = aggregate.finish_forms(csv_stream.load_args(args, ruc_registry, csv_file_paths))
+    else:
+        # the workbooks are parsed once and both forms are computed from the same frames
+        compras, ventas, egresos, ingresos = loader.load_args(args)
+
+        ruc_registry = registry.load_args(args)
+
+        iva_totals, irp_rsp_totals = aggregate.aggregate_forms(compras, ventas, egresos, ruc_registry)
+
+    aggregate.log_iva_totals(iva_totals)
+    logging.info("Successfully generated IVA Form values")
+
+    aggregate.log_irp_rsp_totals(irp_rsp_totals)
+    logging.info("Successfully generated IRP-RSP Form values")
+
+    profiling.finish(args)
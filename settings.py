@@ -0,0 +1,49 @@
+# taxpayer specific settings shared by the IRP-RSP calculations
+
+RUCS_EGRESOS_ACTIV_GRAVADA = [
+    "80081262",  # COMPUMARKET S.A.
+    "80003128",  # TOYOTOSHI SA
+    "80126207",  # TOYOTOSHI GROUP SA
+    "80024191",  # ESSAP SA
+    "80044227",  # BANCO GNB PARAGUAY SAECA
+    "80030572",  # AMX PARAGUAY SA
+    "80085098",  # BEBIDAS NATIVAS DEL PARAGUAY SA
+    "80033722",  # SERVICIOS MEDICOS MIGONE SOCIEDAD ANONIMA
+    "80017437",  # NUCLEO SA
+    "80002201",  # BANCO ITAU PARAGUAY S.A
+    "80025958",  # PLAZA OFERTA S.A.
+    "3626475",   # FIXO CARGO
+    "80009735",  # ANDE
+    "80016742",  # ESTACION BAHIA SA
+    "80040939",  # GESTION DE SERVICIOS SA
+    "80019551",  # CADENA FARMACENTER SA
+    "80032012",  # GRUPO ENERGY S.A.
+    "80030535",  # FARMACIAS CATEDRAL SA
+    "80011311",  # DIAZ GILL MEDICINA LABORATORIAL SA
+    "80022877",  # FARMA S.A.
+    "80023598",  # SANATORIO MIGONE BATTILANA SA
+    "80001513",  # NUEVA AMERICANA SA
+    "349840",    # JUAN ORLANDO PEREIRA MENDEZ
+    "80082790",  # VIGOR SA
+    "1238373",   # BERTA
+    "80003064",  # WASHINGTON SRL
+    "2956920",   # GUSTAVO DANIEL CACERES KALLSEN
+    "80004379",  # HERIMARC SRL
+    "80088090",  # MASQUELIER MEDICINA INTEGRATIVA SA
+    "80004261",  # MICROLIDER
+    "80031970",  # TUPI RAMOS GENERALES S.A.
+    "80000747",  # COOMECIPAR LTDA.
+    "80034461",  # SUDAMERIS BANK SAECA
+    "80022557",  # FERIA ASUNCION SA
+]
+
+RUCS_ESTADO_ASOCIACIONES = [
+    "80004239",  # MOPC
+    "80027621",  # CLUB CENTENARIO
+    "80029733",  # CLUB OLIMPIA
+    "80031086",  # CLUB NAUTICO
+]
+
+GASTOS_EXTERIOR_SALUD_EDUCACION = 0
+
+GASTOS_VEHICULOS_CADA_3Y = 0
@@ -0,0 +1,121 @@
+import argparse
+import logging
+import pathlib
+import datetime
+import numpy as np
+import openpyxl
+import schema
+from settings import RUCS_EGRESOS_ACTIV_GRAVADA, RUCS_ESTADO_ASOCIACIONES
+
+logging.basicConfig(format='%(levelname)s %(message)s', level=logging.DEBUG)
+
+# every header read by iva.py and irp-rsp.py, in the order of a SET export
+COL_HEADERS = [
+    schema.COL_TIPO_REGISTRO,
+    schema.COL_RUC2,
+    schema.COL_RUC,
+    schema.COL_RUC_IVA,
+    schema.COL_RUC_EGRESOS,
+    schema.COL_TIPO_COMPROBANTE,
+    schema.COL_FECHA_EMISION,
+    schema.COL_TIMBRADO,
+    schema.COL_NUMERO_COMPROBANTE,
+    schema.COL_MONTO_10,
+    schema.COL_MONTO_5,
+    schema.COL_MONTO_0,
+    schema.COL_TOTAL_COMPROBANTE,
+    schema.COL_CONDICION_OPERACION,
+    schema.COL_IMPUTA_IRP,
+    schema.COL_NO_IMPUTAR,
+]
+
+TIPOS_REGISTRO = ["COMPRAS", "VENTAS", "EGRESOS", "INGRESOS"]
+TIPOS_REGISTRO_WEIGHTS = [0.5, 0.2, 0.2, 0.1]
+TIPOS_COMPROBANTE = ["FACTURA", "NOTA DE CRÉDITO", "AUTOFACTURA"]
+TIPOS_COMPROBANTE_WEIGHTS = [0.9, 0.07, 0.03]
+TIPOS_COMPROBANTE_EGRESOS = [
+    "EXTRACTO DE CUENTA TC/TD",
+    "COMPROBANTE DE EGRESOS POR COMPRAS A CRÉDITO",
+    "COMPROBANTE DE INGRESOS ENTIDADES PÚBLICAS, RELIGIOSA O DE BENEFICIO PÚBLICO",
+]
+CONDICIONES = ["CONTADO", "Contado", "CREDITO", "Crédito"]
+CONDICIONES_WEIGHTS = [0.6, 0.1, 0.25, 0.05]
+RUC_INFORMANTE = 4444444
+FISCAL_YEAR = 2022
+
+
+def generate_rows(total_rows, rng):
+    # a pool of counterparties where the classified RUCs of settings.py show up often enough to matter
+    ruc_pool = np.concatenate([
+        np.array(RUCS_EGRESOS_ACTIV_GRAVADA + RUCS_ESTADO_ASOCIACIONES, dtype=np.int64),
+        rng.integers(1000000, 80200000, size=max(total_rows // 20, 10)),
+    ])
+
+    tipos = rng.choice(TIPOS_REGISTRO, size=total_rows, p=TIPOS_REGISTRO_WEIGHTS)
+    rucs = rng.choice(ruc_pool, size=total_rows)
+    tipos_comprobante = rng.choice(TIPOS_COMPROBANTE, size=total_rows, p=TIPOS_COMPROBANTE_WEIGHTS)
+    tipos_comprobante_egresos = rng.choice(TIPOS_COMPROBANTE_EGRESOS, size=total_rows)
+    days = rng.integers(0, 365, size=total_rows)
+    timbrados = rng.integers(10000000, 20000000, size=total_rows)
+    montos_10 = rng.integers(0, 5000000, size=total_rows)
+    montos_5 = np.where(rng.random(total_rows) < 0.2, rng.integers(0, 1000000, size=total_rows), 0)
+    montos_0 = np.where(rng.random(total_rows) < 0.3, rng.integers(0, 1000000, size=total_rows), 0)
+    condiciones = rng.choice(CONDICIONES, size=total_rows, p=CONDICIONES_WEIGHTS)
+    imputa = rng.random(total_rows) < 0.8
+
+    first_day = datetime.date(FISCAL_YEAR, 1, 1)
+    for i in range(total_rows):
+        fecha = first_day + datetime.timedelta(days=int(days[i]))
+        numero = f"001-{i % 999 + 1:03d}-{i + 1:07d}"
+        imputa_irp, no_imputar = ("SI", "NO") if imputa[i] else ("NO", "SI")
+        ruc = int(rucs[i])
+
+        if tipos[i] == "EGRESOS":
+            # egresos only carry a total and use their own RUC header
+            total = int(montos_10[i] + montos_0[i])
+            yield ["EGRESOS", RUC_INFORMANTE, None, None, ruc, str(tipos_comprobante_egresos[i]), fecha, None, numero,
+                   None, None, None, total, None, imputa_irp, no_imputar]
+        else:
+            monto_10, monto_5, monto_0 = int(montos_10[i]), int(montos_5[i]), int(montos_0[i])
+            yield [str(tipos[i]), RUC_INFORMANTE, ruc, ruc, None, str(tipos_comprobante[i]), fecha, int(timbrados[i]),
+                   numero, monto_10, monto_5, monto_0, monto_10 + monto_5 + monto_0, str(condiciones[i]), imputa_irp,
+                   no_imputar]
+
+
+def write_workbook(xls_file_path, rows):
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Datos")
+    worksheet.append(COL_HEADERS)
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(xls_file_path)
+
+
+def generate(output_path, total_rows, total_files=1, seed=0):
+    output_path = pathlib.Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    rows = generate_rows(total_rows, rng)
+
+    xls_file_paths = []
+    for i in range(total_files):
+        # spread the rows evenly, the first files take the remainder
+        file_rows = total_rows // total_files + (i < total_rows % total_files)
+        xls_file_path = output_path / f"synthetic_{total_rows}_{i + 1:02d}.xlsx"
+        write_workbook(xls_file_path, (next(rows) for _ in range(file_rows)))
+        xls_file_paths.append(xls_file_path)
+        logging.info(f"Wrote {file_rows} rows to {xls_file_path}")
+
+    return xls_file_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, default="data")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.output, args.rows, total_files=args.files, seed=args.seed)
@@ -0,0 +1,151 @@
+import os
+import time
+import zipfile
+import logging
+import lazy
+import schema
+import loader
+import profiling
+import aggregate
+import csv_stream
+import dedup
+import workbook_cache
+from functools import partial
+from concurrent import futures
+
+WATCH_INTERVAL = 1.0
+# what opening a workbook that is still being copied fails with, errors in the data itself are not among them
+READ_ERRORS = (OSError, zipfile.BadZipFile)
+
+
+def signature(xls_file_path):
+    stat = os.stat(xls_file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@profiling.profiled("file_partials")
+def file_partials(file_path, ruc_registry, cache_dir=None, chunk_rows=csv_stream.CSV_CHUNK_ROWS,
+                  encoding=csv_stream.CSV_ENCODING, thousands=None):
+    # the same files a run without --watch reads: the workbooks and the csv/txt exports, the latter chunk by chunk
+    if file_path.suffix.lower() in csv_stream.CSV_SUFFIXES:
+        reason = csv_stream.skip_reason(file_path)
+        if reason is not None:
+            logging.warning(f"Skipping {file_path}, {reason}")
+            return None
+        return csv_stream.reduce_export(file_path, ruc_registry, chunk_rows=chunk_rows, encoding=encoding,
+                                        thousands=thousands)
+
+    partitions = loader.partition_tipo_registro(schema.conform(loader.read_workbook(file_path, cache_dir=cache_dir)))
+    return aggregate.form_partials(partitions["COMPRAS"], partitions["VENTAS"], partitions["EGRESOS"], ruc_registry)
+
+
+def try_file_partials(file_path, ruc_registry, **kwargs):
+    # a workbook that is still being copied is not a valid zip yet, the error is returned instead of stopping the
+    # watch; a missing column or a bad amount is raised, a file is never silently left out of the totals
+    try:
+        return file_partials(file_path, ruc_registry, **kwargs)
+    except READ_ERRORS as e:
+        return e
+
+
+def scan(path):
+    signatures = {}
+    for file_path in [*loader.list_workbooks(path), *csv_stream.list_csv_files(path)]:
+        try:
+            signatures[file_path] = signature(file_path)
+        except FileNotFoundError:
+            continue  # removed between the listing and the stat
+    return signatures
+
+
+def refresh(workbooks, path, ruc_registry, workers=None, cache_dir=None, executor=None,
+            chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING, thousands=None):
+    # workbooks maps every known workbook and export to its (signature, partial sums), only the ones whose signature
+    # changed are parsed again; returns whether anything changed. Unreadable workbooks and csv/txt files that are not
+    # exports are kept without sums, so they are looked at again once their signature changes. A long running
+    # caller can pass its own process pool as executor
+    signatures = scan(path)
+
+    removed = [file_path for file_path in workbooks if file_path not in signatures]
+    changed = [file_path for file_path, file_signature in signatures.items()
+               if file_path not in workbooks or workbooks[file_path][0] != file_signature]
+
+    for file_path in removed:
+        logging.info(f"Removed {file_path}")
+        del workbooks[file_path]
+    for file_path in changed:
+        logging.info(f"Loading {file_path}")
+
+    workers = min(workers or os.cpu_count() or 1, max(len(changed), 1))
+    read = partial(try_file_partials, ruc_registry=ruc_registry, cache_dir=cache_dir, chunk_rows=chunk_rows,
+                   encoding=encoding, thousands=thousands)
+    if executor is not None and changed:
+        results = list(zip(changed, executor.map(read, changed)))
+    elif workers > 1:
+        lazy.preload()
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(zip(changed, executor.map(read, changed)))
+    else:
+        results = [(file_path, read(file_path)) for file_path in changed]
+
+    updated = bool(removed)
+    for file_path, result in results:
+        if isinstance(result, Exception):
+            # most likely still being written, finishing the copy changes the signature
+            logging.warning(f"Could not read {file_path}, retrying once it changes: {result}")
+            result = None
+        workbooks[file_path] = (signatures[file_path], result)
+        updated = True
+
+    return updated
+
+
+def watch(path, ruc_registry, interval=WATCH_INTERVAL, workers=None, cache_dir=None,
+          chunk_rows=csv_stream.CSV_CHUNK_ROWS, encoding=csv_stream.CSV_ENCODING, thousands=None):
+    workbooks = {}
+    logging.info(f"Watching {path} every {interval}s, stop with Ctrl+C")
+
+    while True:
+        started = time.perf_counter()
+        if refresh(workbooks, path, ruc_registry, workers=workers, cache_dir=cache_dir, chunk_rows=chunk_rows,
+                   encoding=encoding, thousands=thousands):
+            loaded = [partials for _, partials in workbooks.values() if partials is not None]
+            if loaded:
+                partials = aggregate.merge_sums(loaded)
+                iva_totals, irp_rsp_totals = aggregate.finish_forms(partials)
+
+                aggregate.log_iva_totals(iva_totals)
+                aggregate.log_irp_rsp_totals(irp_rsp_totals)
+                logging.info(f"Updated totals of {len(loaded)} files in {time.perf_counter() - started:.3f}s")
+            else:
+                logging.info(f"No workbooks or exports in {path}")
+
+        time.sleep(interval)
+
+
+def add_arguments(parser):
+    parser.add_argument('--watch', action="store_true", help="keep running and update the totals when workbooks change")
+    parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL, help="seconds between directory polls")
+
+
+def check_args(parser, args):
+    # only the partial sums of every file are kept between polls, what needs all the rows at once is not done
+    if not args.watch:
+        return
+    for option, used in [("--rollup-db", args.rollup_db is not None),
+                         ("--duplicates drop", args.duplicates == dedup.DUPLICATES_DROP),
+                         ("--duplicates-output", args.duplicates_output is not None),
+                         ("--memory-report", args.memory_report),
+                         ("--profile", args.profile)]:
+        if used:
+            parser.error(f"{option} cannot be combined with --watch")
+
+
+def watch_args(args, ruc_registry):
+    if args.clear_cache and args.cache_dir is not None:
+        logging.info(f"Removed {workbook_cache.invalidate(args.cache_dir)} cached workbooks")
+    if args.duplicates != dedup.DUPLICATES_KEEP:
+        logging.info("Duplicated comprobantes are not looked for while watching")
+
+    watch(args.path, ruc_registry, interval=args.watch_interval, workers=args.workers, cache_dir=args.cache_dir,
+          chunk_rows=args.chunk_rows, encoding=args.csv_encoding, thousands=args.csv_thousands)
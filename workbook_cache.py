@@ -0,0 +1,104 @@
+import os
+import hashlib
+import logging
+import pathlib
+import lazy
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+
+CACHE_SUFFIX = ".npz"
+CACHE_READ_BLOCK_SIZE = 1 << 20
+CACHE_MAX_BYTES = 1 << 30
+
+
+def path_digest(xls_file_path):
+    return hashlib.blake2b(str(pathlib.Path(xls_file_path).resolve()).encode(), digest_size=8).hexdigest()
+
+
+def cache_key(xls_file_path, columns=()):
+    stat = os.stat(xls_file_path)
+
+    content = hashlib.blake2b(digest_size=16)
+    with open(xls_file_path, "rb") as f:
+        for block in iter(lambda: f.read(CACHE_READ_BLOCK_SIZE), b""):
+            content.update(block)
+
+    # entries are named <path>-<columns>-<path|size|mtime|content> so that every entry of a workbook can be found
+    # by its path, and scripts reading different columns of the same workbook do not overwrite each other
+    variant = hashlib.blake2b("|".join(columns).encode(), digest_size=4).hexdigest()
+    key = f"{pathlib.Path(xls_file_path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{content.hexdigest()}"
+    return f"{path_digest(xls_file_path)}-{variant}-{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"
+
+
+def load(cache_dir, key):
+    entry_path = pathlib.Path(cache_dir) / f"{key}{CACHE_SUFFIX}"
+    if not entry_path.exists():
+        return None
+
+    try:
+        # object columns (mixed strings / NaN) are pickled inside the npz, the cache dir is ours so this is fine
+        with np.load(entry_path, allow_pickle=True) as entry:
+            columns = entry["columns"]
+            data = pd.DataFrame({i: entry[f"c{i}"] for i in range(len(columns))})
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable cache entry {entry_path}: {e}")
+        return None
+
+    data.columns = list(columns)
+
+    # touch the entry so the eviction sees it as recently used
+    os.utime(entry_path)
+
+    return data
+
+
+def store(cache_dir, key, data):
+    cache_dir = pathlib.Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # drop the entries of older versions of the same workbook
+    variant_prefix = key.rsplit("-", 1)[0]
+    for stale_path in cache_dir.glob(f"{variant_prefix}-*{CACHE_SUFFIX}"):
+        stale_path.unlink(missing_ok=True)
+
+    columns = np.empty(len(data.columns), dtype=object)
+    columns[:] = list(data.columns)
+    arrays = {f"c{i}": data.iloc[:, i].to_numpy() for i in range(len(data.columns))}
+
+    # write to a temp file first so concurrent readers never see a half written entry
+    entry_path = cache_dir / f"{key}{CACHE_SUFFIX}"
+    tmp_path = cache_dir / f"{key}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, columns=columns, **arrays)
+    os.replace(tmp_path, entry_path)
+
+
+def invalidate(cache_dir, xls_file_path=None):
+    pattern = f"{path_digest(xls_file_path)}-*{CACHE_SUFFIX}" if xls_file_path else f"*{CACHE_SUFFIX}"
+
+    total_removed = 0
+    for entry_path in pathlib.Path(cache_dir).glob(pattern):
+        entry_path.unlink(missing_ok=True)
+        total_removed += 1
+
+    return total_removed
+
+
+def evict(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    entries = []
+    for entry_path in pathlib.Path(cache_dir).glob(f"*{CACHE_SUFFIX}"):
+        stat = entry_path.stat()
+        entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+
+    # remove least recently used entries first until the cache fits
+    total_bytes = sum(size for _, size, _ in entries)
+    total_evicted = 0
+    for _, size, entry_path in sorted(entries, key=lambda entry: entry[0]):
+        if total_bytes <= max_bytes:
+            break
+        entry_path.unlink(missing_ok=True)
+        total_bytes -= size
+        total_evicted += 1
+
+    return total_evicted
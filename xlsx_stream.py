@@ -0,0 +1,59 @@
+import lazy
+
+np = lazy.load("numpy")
+pd = lazy.load("pandas")
+openpyxl = lazy.load("openpyxl")
+
+XLSX_MIN_CAPACITY = 1024
+
+
+def empty_column(dtype, capacity):
+    return np.full(capacity, np.nan, dtype=dtype)
+
+
+def read_columns(xls_file_path, columns, sheet_name="Datos"):
+    # columns maps each wanted header to its dtype ("float64" for amounts, object for text); headers missing from
+    # the sheet are left out of the result the same way pd.read_excel would not have them either
+    workbook = openpyxl.load_workbook(xls_file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        rows = worksheet.iter_rows(values_only=True)
+
+        # resolve the header row once, the first occurrence of a repeated header wins
+        header = next((row for row in rows if any(value is not None for value in row)), ())
+        indexes = {}
+        for i, name in enumerate(header):
+            if name in columns and name not in indexes:
+                indexes[name] = i
+
+        # the sheet dimension is only a hint, some exporters write a wrong one
+        capacity = max((worksheet.max_row or 0) - 1, XLSX_MIN_CAPACITY)
+        arrays = {name: empty_column(columns[name], capacity) for name in indexes}
+
+        total_rows = 0
+        for row in rows:
+            # blank rows are skipped like pd.read_excel does
+            if all(value is None for value in row):
+                continue
+
+            if total_rows == capacity:
+                arrays = {name: np.concatenate([array, empty_column(array.dtype, capacity)]) for name, array in arrays.items()}
+                capacity *= 2
+
+            for name, i in indexes.items():
+                value = row[i] if i < len(row) else None
+                if value is None or value == "":
+                    continue
+
+                try:
+                    arrays[name][total_rows] = value
+                except (TypeError, ValueError):
+                    # non numeric value in an amount column, keep it as is like pd.read_excel would
+                    arrays[name] = arrays[name].astype(object)
+                    arrays[name][total_rows] = value
+
+            total_rows += 1
+    finally:
+        workbook.close()
+
+    return pd.DataFrame({name: arrays[name][:total_rows] for name in columns if name in arrays})